@@ -61,6 +61,31 @@ class AsyncHttpRequest:
         False,
       )
     
+    async def GenerateCanvasWithTools(
+        self,
+        user_input: str,context: str,date: str,
+        baml_options: BamlCallOptions = {},
+    ) -> baml_py.HTTPRequest:
+      __tb__ = baml_options.get("tb", None)
+      if __tb__ is not None:
+        tb = __tb__._tb # type: ignore (we know how to use this private attribute)
+      else:
+        tb = None
+      __cr__ = baml_options.get("client_registry", None)
+
+      return await self.__runtime.build_request(
+        "GenerateCanvasWithTools",
+        {
+          "user_input": user_input,
+          "context": context,
+          "date": date,
+        },
+        self.__ctx_manager.get(),
+        tb,
+        __cr__,
+        False,
+      )
+    
     async def GenerateToolCalls(
         self,
         title: str,type: str,description: str,context: str,date: str,
@@ -123,6 +148,31 @@ class AsyncHttpStreamRequest:
         True,
       )
     
+    async def GenerateCanvasWithTools(
+        self,
+        user_input: str,context: str,date: str,
+        baml_options: BamlCallOptions = {},
+    ) -> baml_py.HTTPRequest:
+      __tb__ = baml_options.get("tb", None)
+      if __tb__ is not None:
+        tb = __tb__._tb # type: ignore (we know how to use this private attribute)
+      else:
+        tb = None
+      __cr__ = baml_options.get("client_registry", None)
+
+      return await self.__runtime.build_request(
+        "GenerateCanvasWithTools",
+        {
+          "user_input": user_input,
+          "context": context,
+          "date": date,
+        },
+        self.__ctx_manager.get(),
+        tb,
+        __cr__,
+        True,
+      )
+    
     async def GenerateToolCalls(
         self,
         title: str,type: str,description: str,context: str,date: str,
@@ -63,6 +63,32 @@ class LlmResponseParser:
 
       return cast(types.Canvas, parsed)
     
+    def GenerateCanvasWithTools(
+        self,
+        llm_response: str,
+        baml_options: BamlCallOptions = {},
+    ) -> types.ToolCanvas:
+      __tb__ = baml_options.get("tb", None)
+      if __tb__ is not None:
+        tb = __tb__._tb # type: ignore (we know how to use this private attribute)
+      else:
+        tb = None
+      __cr__ = baml_options.get("client_registry", None)
+
+      parsed = self.__runtime.parse_llm_response(
+        "GenerateCanvasWithTools",
+        llm_response,
+        types,
+        types,
+        partial_types,
+        False,
+        self.__ctx_manager.get(),
+        tb,
+        __cr__,
+      )
+
+      return cast(types.ToolCanvas, parsed)
+    
     def GenerateToolCalls(
         self,
         llm_response: str,
@@ -126,6 +152,32 @@ class LlmStreamParser:
 
       return cast(partial_types.Canvas, parsed)
     
+    def GenerateCanvasWithTools(
+        self,
+        llm_response: str,
+        baml_options: BamlCallOptions = {},
+    ) -> partial_types.ToolCanvas:
+      __tb__ = baml_options.get("tb", None)
+      if __tb__ is not None:
+        tb = __tb__._tb # type: ignore (we know how to use this private attribute)
+      else:
+        tb = None
+      __cr__ = baml_options.get("client_registry", None)
+
+      parsed = self.__runtime.parse_llm_response(
+        "GenerateCanvasWithTools",
+        llm_response,
+        types,
+        types,
+        partial_types,
+        True,
+        self.__ctx_manager.get(),
+        tb,
+        __cr__,
+      )
+
+      return cast(partial_types.ToolCanvas, parsed)
+    
     def GenerateToolCalls(
         self,
         llm_response: str,
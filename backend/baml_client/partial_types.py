@@ -46,3 +46,12 @@ class Tile(BaseModel):
 class Tool(BaseModel):
     type: Optional[types.ToolType] = None
     inputs: List[str]
+
+class ToolCanvas(BaseModel):
+    tiles: List["ToolTile"]
+
+class ToolTile(BaseModel):
+    title: Optional[str] = None
+    type: Optional[types.DiagramType] = None
+    content: Optional[str] = None
+    tool: Optional["Tool"] = None
@@ -125,6 +125,33 @@ class BamlSyncClient:
       )
       return cast(types.Canvas, raw.cast_to(types, types, partial_types, False))
     
+    def GenerateCanvasWithTools(
+        self,
+        user_input: str,context: str,date: str,
+        baml_options: BamlCallOptions = {},
+    ) -> types.ToolCanvas:
+      options: BamlCallOptions = {**self.__baml_options, **(baml_options or {})}
+      __tb__ = options.get("tb", None)
+      if __tb__ is not None:
+        tb = __tb__._tb # type: ignore (we know how to use this private attribute)
+      else:
+        tb = None
+      __cr__ = options.get("client_registry", None)
+      collector = options.get("collector", None)
+      collectors = collector if isinstance(collector, list) else [collector] if collector is not None else []
+
+      raw = self.__runtime.call_function_sync(
+        "GenerateCanvasWithTools",
+        {
+          "user_input": user_input,"context": context,"date": date,
+        },
+        self.__ctx_manager.get(),
+        tb,
+        __cr__,
+        collectors,
+      )
+      return cast(types.ToolCanvas, raw.cast_to(types, types, partial_types, False))
+    
     def GenerateToolCalls(
         self,
         title: str,type: str,description: str,context: str,date: str,
@@ -200,6 +227,42 @@ class BamlStreamClient:
         self.__ctx_manager.get(),
       )
     
+    def GenerateCanvasWithTools(
+        self,
+        user_input: str,context: str,date: str,
+        baml_options: BamlCallOptions = {},
+    ) -> baml_py.BamlSyncStream[partial_types.ToolCanvas, types.ToolCanvas]:
+      options: BamlCallOptions = {**self.__baml_options, **(baml_options or {})}
+      __tb__ = options.get("tb", None)
+      if __tb__ is not None:
+        tb = __tb__._tb # type: ignore (we know how to use this private attribute)
+      else:
+        tb = None
+      __cr__ = options.get("client_registry", None)
+      collector = options.get("collector", None)
+      collectors = collector if isinstance(collector, list) else [collector] if collector is not None else []
+
+      raw = self.__runtime.stream_function_sync(
+        "GenerateCanvasWithTools",
+        {
+          "user_input": user_input,
+          "context": context,
+          "date": date,
+        },
+        None,
+        self.__ctx_manager.get(),
+        tb,
+        __cr__,
+        collectors,
+      )
+
+      return baml_py.BamlSyncStream[partial_types.ToolCanvas, types.ToolCanvas](
+        raw,
+        lambda x: cast(partial_types.ToolCanvas, x.cast_to(types, types, partial_types, True)),
+        lambda x: cast(types.ToolCanvas, x.cast_to(types, types, partial_types, False)),
+        self.__ctx_manager.get(),
+      )
+    
     def GenerateToolCalls(
         self,
         title: str,type: str,description: str,context: str,date: str,
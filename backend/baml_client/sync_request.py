@@ -60,6 +60,29 @@ class HttpRequest:
         False,
       )
     
+    def GenerateCanvasWithTools(
+        self,
+        user_input: str,context: str,date: str,
+        baml_options: BamlCallOptions = {},
+    ) -> baml_py.HTTPRequest:
+      __tb__ = baml_options.get("tb", None)
+      if __tb__ is not None:
+        tb = __tb__._tb # type: ignore (we know how to use this private attribute)
+      else:
+        tb = None
+      __cr__ = baml_options.get("client_registry", None)
+
+      return self.__runtime.build_request_sync(
+        "GenerateCanvasWithTools",
+        {
+          "user_input": user_input,"context": context,"date": date,
+        },
+        self.__ctx_manager.get(),
+        tb,
+        __cr__,
+        False,
+      )
+    
     def GenerateToolCalls(
         self,
         title: str,type: str,description: str,context: str,date: str,
@@ -117,6 +140,29 @@ class HttpStreamRequest:
         True,
       )
     
+    def GenerateCanvasWithTools(
+        self,
+        user_input: str,context: str,date: str,
+        baml_options: BamlCallOptions = {},
+    ) -> baml_py.HTTPRequest:
+      __tb__ = baml_options.get("tb", None)
+      if __tb__ is not None:
+        tb = __tb__._tb # type: ignore (we know how to use this private attribute)
+      else:
+        tb = None
+      __cr__ = baml_options.get("client_registry", None)
+
+      return self.__runtime.build_request_sync(
+        "GenerateCanvasWithTools",
+        {
+          "user_input": user_input,"context": context,"date": date,
+        },
+        self.__ctx_manager.get(),
+        tb,
+        __cr__,
+        True,
+      )
+    
     def GenerateToolCalls(
         self,
         title: str,type: str,description: str,context: str,date: str,
@@ -64,3 +64,12 @@ class Tile(BaseModel):
 class Tool(BaseModel):
     type: "ToolType"
     inputs: List[str]
+
+class ToolCanvas(BaseModel):
+    tiles: List["ToolTile"]
+
+class ToolTile(BaseModel):
+    title: str
+    type: "DiagramType"
+    content: str
+    tool: "Tool"
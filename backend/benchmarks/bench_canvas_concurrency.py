@@ -0,0 +1,149 @@
+"""
+Event-loop concurrency benchmark for POST /canvas.
+
+Fires N concurrent /canvas requests against the FastAPI app (in-process, via
+httpx's ASGI transport) and long-polls each job until it is done, while the LLM
+and the SIX tools are replaced by stubs that only sleep. While the burst is
+running, a poller keeps hitting GET /canvas/{session_id} to measure how long
+cheap requests are stalled.
+
+If the pipeline is non-blocking, wall time stays close to a single canvas
+latency and throughput grows with N. With --blocking the planning stub sleeps
+synchronously (like the old sync GenerateCanvas call) and everything serializes.
+
+Example Usage:
+
+cd backend
+python -m benchmarks.bench_canvas_concurrency --concurrency 1 5 10 20
+python -m benchmarks.bench_canvas_concurrency --blocking
+python -m benchmarks.bench_canvas_concurrency --upstream-limits
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import time
+
+backend_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(backend_path)
+
+import httpx
+
+import main
+from benchmarks.stub_baml import StubBamlClient, install_stubs, stub_tools
+
+API_KEY = next(iter(main.API_KEYS))
+
+
+async def run_burst(concurrency: int) -> dict:
+    transport = httpx.ASGITransport(app=main.app)
+    headers = {"API-KEY": API_KEY}
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        # A session that already exists, so the poller gets cheap 200s.
+        await client.post(
+            "/canvas",
+            params={"prompt": "warmup", "session_id": "poll"},
+            headers=headers,
+        )
+
+        done = asyncio.Event()
+        poll_latencies = []
+
+        async def poll():
+            while not done.is_set():
+                start = time.perf_counter()
+                await client.get("/canvas/poll", headers=headers)
+                poll_latencies.append(time.perf_counter() - start)
+                await asyncio.sleep(0.01)
+
+        async def post(i: int):
+            session_id = f"bench-{concurrency}-{i}"
+            response = await client.post(
+                "/canvas",
+                params={"prompt": f"bench {i}", "session_id": session_id},
+                headers=headers,
+            )
+            response.raise_for_status()
+            status, version = response.json()["status"], None
+            while status not in ("done", "failed"):
+                params = (
+                    {"wait": 10}
+                    if version is None
+                    else {"wait": 10, "version": version}
+                )
+                state = (
+                    await client.get(
+                        f"/canvas/{session_id}", params=params, headers=headers
+                    )
+                ).json()
+                status, version = state["status"], state["version"]
+
+        poller = asyncio.create_task(poll())
+        start = time.perf_counter()
+        await asyncio.gather(*(post(i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await poller
+
+    return {
+        "concurrency": concurrency,
+        "elapsed": elapsed,
+        "throughput": concurrency / elapsed,
+        "poll_p50": statistics.median(poll_latencies) if poll_latencies else 0.0,
+        "poll_max": max(poll_latencies) if poll_latencies else 0.0,
+    }
+
+
+async def run(levels: list[int]):
+    print(
+        f"{'N':>4} {'wall [s]':>9} {'canvas/s':>9} "
+        f"{'poll p50 [ms]':>14} {'poll max [ms]':>14}"
+    )
+    for concurrency in levels:
+        result = await run_burst(concurrency)
+        print(
+            f"{result['concurrency']:>4} {result['elapsed']:>9.2f} "
+            f"{result['throughput']:>9.2f} {result['poll_p50'] * 1000:>14.1f} "
+            f"{result['poll_max'] * 1000:>14.1f}"
+        )
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 5, 10, 20])
+    parser.add_argument("--plan-delay", type=float, default=0.5)
+    parser.add_argument("--tool-delay", type=float, default=0.3)
+    parser.add_argument("--fetch-delay", type=float, default=0.2)
+    parser.add_argument(
+        "--blocking",
+        action="store_true",
+        help="Block the event loop during planning, like the old sync GenerateCanvas.",
+    )
+    parser.add_argument(
+        "--upstream-limits",
+        action="store_true",
+        help="Keep the default per-upstream limiters instead of lifting them.",
+    )
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    client = StubBamlClient(
+        plan_latency=f"fixed:{args.plan_delay}",
+        tool_latency=f"fixed:{args.tool_delay}",
+        blocking=args.blocking,
+    )
+    install_stubs(
+        client,
+        tools=stub_tools(f"fixed:{args.fetch_delay}"),
+        upstream_limits=args.upstream_limits,
+    )
+    asyncio.run(run(args.concurrency))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,230 @@
+"""
+Offline end-to-end benchmark of the canvas backend.
+
+Nothing leaves the machine: SIX is served by the fake SIX server
+(benchmarks/fake_six.py, uvicorn in a background thread, SIX_BASE_URL points to
+it) and the LLM by a stub BAML client returning canned canvases and tool calls
+(benchmarks/stub_baml.py). Everything in between runs for real: the SIX client
+and its connection pool, decoding, the OHLCV cache, limiters, deadlines and
+circuit breaker, the session store and the canvas archive (in a temporary
+directory).
+
+For every concurrency level N, N canvases are generated at once, either by
+calling generate_canvas directly (--target pipeline) or through the FastAPI app
+with POST /canvas and long-polling GET /canvas/{session_id} (--target api).
+Reported are the throughput, the p50/p95/p99 of every pipeline stage (the spans
+of metrics.py) and the peak RSS of the process so far.
+
+The LLM plan and tool-call caches are disabled so every canvas pays the LLM
+latency. The OHLCV cache stays on, but every run (target and concurrency
+level) uses symbols and search queries of its own, so each run starts cold
+instead of measuring the cache warmed by the previous one. Within a run,
+--symbols controls the cache hit rate and how many identical calls coalesce.
+
+Example Usage:
+
+cd backend
+python -m benchmarks.bench_end_to_end --concurrency 1 10 50
+python -m benchmarks.bench_end_to_end --target api --mode speculative \\
+    --llm-latency lognormal:0.8,0.3 --six-latency lognormal:0.08,0.7 --symbols 200
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+backend_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(backend_path)
+sys.path.append(os.path.join(backend_path, "src"))
+
+import httpx
+
+from benchmarks.fake_six import FakeSixServer
+from benchmarks.stub_baml import StubBamlClient, install_stubs
+
+# main, generate_canvas and metrics are imported in main_cli, once SIX_BASE_URL
+# and CANVAS_ARCHIVE_DB point to the fake server and the temporary directory.
+
+
+class StageRecorder:
+    """Keeps every successful span duration, the histograms only keep buckets."""
+
+    def __init__(self, histogram):
+        self.samples: dict[str, list[float]] = defaultdict(list)
+        observe = histogram.observe
+
+        def recording_observe(labels: tuple[str, ...], value: float):
+            observe(labels, value)
+            stage, status = labels
+            if status == "ok":
+                self.samples[stage].append(value)
+
+        histogram.observe = recording_observe
+
+    def reset(self):
+        self.samples.clear()
+
+
+def percentiles(samples: list[float]) -> tuple[float, float, float]:
+    if len(samples) == 1:
+        return samples[0], samples[0], samples[0]
+    quantiles = statistics.quantiles(samples, n=100, method="inclusive")
+    return quantiles[49], quantiles[94], quantiles[98]
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+async def run_pipeline(pipeline, concurrency: int, mode: str, level: int) -> int:
+    async def one(i: int) -> int:
+        try:
+            return len(await pipeline.generate_canvas(f"bench {level} {i}", mode=mode))
+        except Exception as e:
+            logging.error("Canvas %s failed: %s", i, e)
+            return 0
+
+    return sum(await asyncio.gather(*(one(i) for i in range(concurrency))))
+
+
+async def run_api(
+    client: httpx.AsyncClient, concurrency: int, mode: str, level: int
+) -> int:
+    async def one(i: int) -> int:
+        session_id = f"bench-{level}-{i}"
+        response = await client.post(
+            "/canvas",
+            params={
+                "prompt": f"bench {level} {i}",
+                "session_id": session_id,
+                "mode": mode,
+            },
+        )
+        response.raise_for_status()
+        state, version = response.json(), None
+        while state["status"] not in ("done", "failed"):
+            params = (
+                {"wait": 10} if version is None else {"wait": 10, "version": version}
+            )
+            state = (await client.get(f"/canvas/{session_id}", params=params)).json()
+            version = state["version"]
+        return len(state["tiles"])
+
+    return sum(await asyncio.gather(*(one(i) for i in range(concurrency))))
+
+
+def print_stages(recorder: StageRecorder):
+    print(
+        f"    {'stage':<30} {'n':>6} {'p50 [ms]':>10} {'p95 [ms]':>10} {'p99 [ms]':>10}"
+    )
+    for stage in sorted(recorder.samples):
+        samples = recorder.samples[stage]
+        p50, p95, p99 = percentiles(samples)
+        print(
+            f"    {stage:<30} {len(samples):>6} "
+            f"{p50 * 1000:>10.1f} {p95 * 1000:>10.1f} {p99 * 1000:>10.1f}"
+        )
+
+
+async def run(args: argparse.Namespace, server: FakeSixServer, stub: StubBamlClient):
+    import main
+    import generate_canvas as pipeline
+    import metrics
+
+    recorder = StageRecorder(metrics.stage_seconds)
+    transport = httpx.ASGITransport(app=main.app)
+    headers = {"API-KEY": next(iter(main.API_KEYS))}
+    async with main.lifespan(main.app):
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench", headers=headers
+        ) as client:
+            for target in args.target:
+                for level, concurrency in enumerate(args.concurrency):
+                    recorder.reset()
+                    stub.namespace = f"{target[0].upper()}{level}-"
+                    six_requests = server.stats["requests"]
+                    start = time.perf_counter()
+                    if target == "pipeline":
+                        tiles = await run_pipeline(
+                            pipeline, concurrency, args.mode, level
+                        )
+                    else:
+                        tiles = await run_api(client, concurrency, args.mode, level)
+                    elapsed = time.perf_counter() - start
+                    print(
+                        f"{target} N={concurrency}: {elapsed:.2f} s, "
+                        f"{concurrency / elapsed:.2f} canvas/s, "
+                        f"{tiles}/{concurrency * args.tiles} tiles, "
+                        f"{server.stats['requests'] - six_requests} SIX requests, "
+                        f"peak RSS {peak_rss_mb():.0f} MB"
+                    )
+                    print_stages(recorder)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--target", nargs="+", choices=("pipeline", "api"), default=["pipeline", "api"]
+    )
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument(
+        "--mode", choices=("staged", "speculative", "single_shot"), default="staged"
+    )
+    parser.add_argument("--tiles", type=int, default=3, help="Tiles per canvas")
+    parser.add_argument(
+        "--symbols", type=int, default=10, help="Distinct symbols across canvases"
+    )
+    parser.add_argument(
+        "--bars", type=int, default=365, help="Calendar days per OHLCV request"
+    )
+    parser.add_argument("--rows", type=int, default=50, help="Rows of a search result")
+    parser.add_argument(
+        "--columns", type=int, default=8, help="Columns of a search result"
+    )
+    parser.add_argument("--llm-latency", default="fixed:0.5")
+    parser.add_argument("--six-latency", default="fixed:0.05")
+    parser.add_argument("--six-error-rate", type=float, default=0.0)
+    parser.add_argument(
+        "--upstream-limits",
+        action="store_true",
+        help="Keep the default per-upstream limiters instead of lifting them.",
+    )
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    archive_dir = tempfile.mkdtemp(prefix="bench-archive-")
+    server = FakeSixServer(
+        latency=args.six_latency,
+        error_rate=args.six_error_rate,
+        rows=args.rows,
+        columns=args.columns,
+    )
+    os.environ["SIX_BASE_URL"] = server.base_url
+    os.environ["CANVAS_ARCHIVE_DB"] = os.path.join(
+        archive_dir, "canvas_archive.sqlite3"
+    )
+
+    stub = StubBamlClient(
+        args.tiles, args.llm_latency, n_symbols=args.symbols, n_bars=args.bars
+    )
+    install_stubs(stub, upstream_limits=args.upstream_limits, archive=True)
+
+    try:
+        with server:
+            asyncio.run(run(args, server, stub))
+    finally:
+        shutil.rmtree(archive_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main_cli()
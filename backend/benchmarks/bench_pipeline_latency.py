@@ -0,0 +1,106 @@
+"""
+Latency check for the per-tile pipeline of generate_canvas.
+
+Uses stubbed LLM and SIX calls with skewed delays: the tile with the slowest
+GenerateToolCalls response has the fastest fetch and vice versa. With two global
+barriers (all tool calls, then all fetches) the canvas takes
+max(LLM) + max(fetch); with per-tile chains it takes max(LLM + fetch per tile).
+
+The script prints both and exits non-zero if generate_canvas is not bounded by
+the slowest per-tile chain.
+
+Example Usage:
+
+cd backend
+python -m benchmarks.bench_pipeline_latency
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+
+backend_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(backend_path)
+sys.path.append(os.path.join(backend_path, "src"))
+
+import generate_canvas as pipeline
+from baml_client.types import DiagramType, Tile, ToolType
+from benchmarks.stub_baml import StubBamlClient, install_stubs
+
+# title -> (GenerateToolCalls delay, fetch delay) in seconds
+SKEWED_DELAYS = {
+    "slow llm, fast fetch": (1.0, 0.1),
+    "fast llm, slow fetch": (0.1, 1.0),
+    "medium": (0.4, 0.4),
+}
+
+
+class SkewedBamlClient(StubBamlClient):
+    def __init__(self):
+        super().__init__(n_tiles=len(SKEWED_DELAYS), plan_latency="fixed:0")
+
+    def plan(self, user_input: str) -> list[Tile]:
+        # The title doubles as the symbol, so stub_ohlcv finds its delay
+        return [
+            Tile(title=title, type=DiagramType.LINE, content=title)
+            for title in SKEWED_DELAYS
+        ]
+
+    def tool_call_delay(self, title: str) -> float:
+        return SKEWED_DELAYS[title][0]
+
+
+async def stub_ohlcv(symbol: str, first: str, last: str) -> list[dict]:
+    await asyncio.sleep(SKEWED_DELAYS[symbol][1])
+    return []
+
+
+async def two_barrier_canvas(user_input: str) -> None:
+    """The previous pipeline: resolve all tool calls, then fetch all data."""
+    tiles = [tile async for _, tile, _ in pipeline.plan_tiles(user_input)]
+    tool_calls = await asyncio.gather(
+        *(pipeline.generate_tool_call(tile, date=True) for tile in tiles)
+    )
+    await asyncio.gather(*(pipeline.perform_tool_call(t) for t in tool_calls))
+
+
+async def timed(coro) -> float:
+    start = time.perf_counter()
+    await coro
+    return time.perf_counter() - start
+
+
+async def run(tolerance: float) -> bool:
+    barriers = await timed(two_barrier_canvas("bench"))
+    per_tile = await timed(pipeline.generate_canvas("bench"))
+
+    slowest_chain = max(llm + fetch for llm, fetch in SKEWED_DELAYS.values())
+    barrier_bound = max(d[0] for d in SKEWED_DELAYS.values()) + max(
+        d[1] for d in SKEWED_DELAYS.values()
+    )
+    print(f"max(per-tile chain)       {slowest_chain:.2f} s")
+    print(f"max(LLM) + max(fetch)     {barrier_bound:.2f} s")
+    print(f"two barriers (previous)   {barriers:.2f} s")
+    print(f"per-tile chains (current) {per_tile:.2f} s")
+    return per_tile <= slowest_chain + tolerance
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    install_stubs(SkewedBamlClient(), tools={ToolType.OHLCV: stub_ohlcv})
+
+    if not asyncio.run(run(args.tolerance)):
+        print("FAIL: canvas latency exceeds the slowest per-tile chain")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
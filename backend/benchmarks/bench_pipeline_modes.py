@@ -0,0 +1,121 @@
+"""
+A/B benchmark of the staged and single-shot planning modes.
+
+"staged" plans the canvas with GenerateCanvas and then calls GenerateToolCalls
+once per tile; "single_shot" asks GenerateCanvasWithTools for the tiles and
+their tool calls at once. Both caches are disabled and the SIX fetches are
+stubbed, so only the LLM part of the pipeline is measured.
+
+With --live the real BAML client is used (API keys from .env) and the
+metrics module reports the number of LLM calls and the input/output tokens
+per run, as read from the BAML collector of every call. Without it a stub
+client sleeps --call-delay seconds per LLM call and only the latency is
+reported.
+
+Example Usage:
+
+cd backend
+python -m benchmarks.bench_pipeline_modes --runs 3
+python -m benchmarks.bench_pipeline_modes --live --runs 3 \\
+    --prompt "Compare Apple and Microsoft"
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import time
+
+backend_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(backend_path)
+sys.path.append(os.path.join(backend_path, "src"))
+
+import generate_canvas as pipeline
+import metrics
+from baml_client.types import DiagramType
+from benchmarks.stub_baml import StubBamlClient, install_stubs, stub_tools
+
+MODES = ("staged", "single_shot")
+
+
+def llm_usage() -> dict:
+    calls = sum(
+        n
+        for (stage, _), n in metrics.stage_seconds.counts().items()
+        if stage.startswith("llm.")
+    )
+    tokens = metrics.llm_tokens.values()
+    return {
+        "llm_calls": calls,
+        "input_tokens": sum(
+            n for (_, direction), n in tokens.items() if direction == "input"
+        ),
+        "output_tokens": sum(
+            n for (_, direction), n in tokens.items() if direction == "output"
+        ),
+    }
+
+
+async def measure(mode: str, prompt: str, context: str, live: bool) -> dict:
+    before = llm_usage()
+
+    start = time.perf_counter()
+    canvas = await pipeline.generate_canvas(prompt, context, mode=mode)
+    result = {"seconds": time.perf_counter() - start, "tiles": len(canvas)}
+    if live:
+        result.update({key: value - before[key] for key, value in llm_usage().items()})
+    return result
+
+
+async def run(args: argparse.Namespace):
+    columns = ["seconds", "tiles"] + (
+        ["llm_calls", "input_tokens", "output_tokens"] if args.live else []
+    )
+    print(f"{'mode':<12}" + "".join(f"{c:>15}" for c in columns))
+    for mode in MODES:
+        results = [
+            await measure(mode, args.prompt, args.context, args.live)
+            for _ in range(args.runs)
+        ]
+        means = {c: statistics.mean(r[c] for r in results) for c in columns}
+        print(f"{mode:<12}" + "".join(f"{means[c]:>15.2f}" for c in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--live", action="store_true", help="Use the real BAML client")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument(
+        "--prompt",
+        default=(
+            "Show the stock price of Apple and one competitor over the past four weeks"
+        ),
+    )
+    parser.add_argument("--context", default="use 2 - 5 tiles as needed.")
+    parser.add_argument("--tiles", type=int, default=4, help="Tiles of the stub canvas")
+    parser.add_argument(
+        "--call-delay", type=float, default=1.0, help="Seconds per stub LLM call"
+    )
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    if args.live:
+        from baml_client.async_client import b
+
+        client = b
+    else:
+        # One larger single-shot response takes somewhat longer than a single plan
+        client = StubBamlClient(
+            n_tiles=args.tiles,
+            plan_latency=f"fixed:{args.call_delay}",
+            tile_types=(DiagramType.LINE,),
+            single_shot_factor=1.5,
+        )
+    install_stubs(client, tools=stub_tools())
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
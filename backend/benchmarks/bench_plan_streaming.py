@@ -0,0 +1,69 @@
+"""
+Benchmark for speculative tool-call generation from the streamed canvas plan.
+
+A stub planner streams a canvas of N tiles over --plan-delay seconds, the same
+way BamlStreamClient.GenerateCanvas emits partial Canvas objects. In "staged"
+mode tool calls start after the whole plan is generated; in "speculative" mode
+each tile starts as soon as the planner has moved on to the next one.
+
+Reports time to first tile and total canvas time per mode.
+
+Example Usage:
+
+cd backend
+python -m benchmarks.bench_plan_streaming --tiles 5 --plan-delay 3
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+
+backend_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(backend_path)
+sys.path.append(os.path.join(backend_path, "src"))
+
+import generate_canvas as pipeline
+from baml_client.types import DiagramType
+from benchmarks.stub_baml import StubBamlClient, install_stubs, stub_tools
+
+
+async def measure(mode: str) -> tuple[float, float]:
+    start = time.perf_counter()
+    first_tile = None
+    async for item in pipeline.stream_canvas("bench", mode=mode):
+        if isinstance(item, pipeline.DataTile) and first_tile is None:
+            first_tile = time.perf_counter() - start
+    return first_tile, time.perf_counter() - start
+
+
+async def run():
+    print(f"{'mode':<12} {'first tile [s]':>15} {'canvas [s]':>11}")
+    for mode in ("staged", "speculative"):
+        first_tile, total = await measure(mode)
+        print(f"{mode:<12} {first_tile:>15.2f} {total:>11.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--tiles", type=int, default=5)
+    parser.add_argument("--plan-delay", type=float, default=3.0)
+    parser.add_argument("--tool-delay", type=float, default=1.0)
+    parser.add_argument("--fetch-delay", type=float, default=0.5)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    client = StubBamlClient(
+        n_tiles=args.tiles,
+        plan_latency=f"fixed:{args.plan_delay}",
+        tool_latency=f"fixed:{args.tool_delay}",
+        tile_types=(DiagramType.LINE,),
+    )
+    install_stubs(client, tools=stub_tools(f"fixed:{args.fetch_delay}"))
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
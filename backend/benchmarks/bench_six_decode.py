@@ -0,0 +1,119 @@
+"""
+Microbenchmark for decoding SIX responses.
+
+Compares the old decode path (response.json() followed by json.loads on every
+nested layer and a dict per bar) with api.six_decode using the standard json
+module and, if installed, orjson. Payloads are multi-year OHLCV series and wide
+search result tables.
+
+Example Usage:
+
+cd backend
+python -m benchmarks.bench_six_decode --repeat 50
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+backend_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(os.path.join(backend_path, "src"))
+
+from api import six_decode
+from api.columnar import OhlcvColumns
+from benchmarks.six_payloads import (
+    ohlcv_envelope,
+    ohlcv_series,
+    search_envelope,
+    search_table,
+)
+
+
+def legacy_ohlcv(content: bytes) -> list[dict]:
+    response_json = json.loads(content.decode())
+    obj = json.loads(response_json["object"])
+    data = json.loads(obj["data"])
+    time_series_raw = json.loads(list(data.values())[0])
+    return [
+        {
+            "name": timestamp.split("T")[0],
+            "open": values["open"],
+            "high": values["high"],
+            "low": values["low"],
+            "close": values["close"],
+            "volume": values["vol"],
+        }
+        for timestamp, values in time_series_raw.items()
+    ]
+
+
+def legacy_search(content: bytes) -> dict:
+    response_json = json.loads(content.decode())
+    obj = json.loads(response_json["object"])
+    return json.loads(obj["data"][0])
+
+
+def with_backend(loads, fn, content):
+    previous = six_decode.loads
+    six_decode.loads = loads
+    try:
+        return fn(content)
+    finally:
+        six_decode.loads = previous
+
+
+def backends() -> dict:
+    result = {"json": json.loads}
+    if six_decode.orjson is not None:
+        result["orjson"] = six_decode.orjson.loads
+    return result
+
+
+def bench(label: str, size: int, fn, repeat: int):
+    seconds = min(timeit.repeat(fn, number=1, repeat=repeat))
+    print(f"{label:<38} {size / 1e6:>8.2f} MB {seconds * 1000:>10.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--years", type=int, nargs="+", default=[1, 10, 30])
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--columns", type=int, default=30)
+    args = parser.parse_args()
+
+    print(f"{'case':<38} {'payload':>11} {'best':>13}")
+    for years in args.years:
+        content = ohlcv_envelope(ohlcv_series(years * 261))
+        bench(
+            f"ohlcv {years}y legacy",
+            len(content),
+            lambda: legacy_ohlcv(content),
+            args.repeat,
+        )
+        for name, loads in backends().items():
+            bench(
+                f"ohlcv {years}y decode+columns ({name})",
+                len(content),
+                lambda: OhlcvColumns.from_six(
+                    with_backend(loads, six_decode.decode_ohlcv, content)
+                ),
+                args.repeat,
+            )
+
+    content = search_envelope(search_table(args.rows, args.columns))
+    label = f"search {args.rows}x{args.columns}"
+    bench(f"{label} legacy", len(content), lambda: legacy_search(content), args.repeat)
+    for name, loads in backends().items():
+        bench(
+            f"{label} decode ({name})",
+            len(content),
+            lambda: with_backend(loads, six_decode.decode_search, content),
+            args.repeat,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+Local stand-in for the SIX container app.
+
+Serves POST /ohlcv and POST /searchwithcriteria with the nested envelope of the
+real API (see six_payloads.py). /ohlcv returns one bar per business day between
+`first` and `last`, so the payload size follows the requested range; the search
+table has a configurable number of rows and columns. Every response waits for a
+delay drawn from a latency distribution, and a share of the requests can fail
+with 503 to exercise the limiters and the circuit breaker.
+
+Latency distributions are given as "<name>:<parameters>" in seconds:
+
+    fixed:0.05              always 50 ms
+    uniform:0.02,0.2        between 20 and 200 ms
+    lognormal:0.05,0.6      median 50 ms, sigma 0.6 (long tail)
+
+Example Usage:
+
+cd backend
+python -m benchmarks.fake_six --port 8100 --latency lognormal:0.05,0.6
+SIX_BASE_URL=http://127.0.0.1:8100 python src/generate_canvas.py
+
+with FakeSixServer(latency="fixed:0.02") as server:
+    os.environ["SIX_BASE_URL"] = server.base_url
+"""
+
+import argparse
+import asyncio
+import math
+import random
+import socket
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Callable
+
+import uvicorn
+from fastapi import FastAPI, Response
+
+from benchmarks.six_payloads import (
+    ohlcv_envelope,
+    ohlcv_series,
+    search_envelope,
+    search_table,
+)
+
+SIX_DATE_FORMAT = "%d.%m.%Y"
+
+
+def parse_latency(spec: str) -> Callable[[], float]:
+    """Return a function drawing delays in seconds from the distribution `spec`."""
+    name, _, parameters = spec.partition(":")
+    values = [float(value) for value in parameters.split(",") if value]
+    if name == "fixed" and len(values) == 1:
+        return lambda: values[0]
+    if name == "uniform" and len(values) == 2:
+        return lambda: random.uniform(values[0], values[1])
+    if name == "lognormal" and len(values) == 2:
+        median, sigma = values
+        return lambda: random.lognormvariate(math.log(median), sigma)
+    raise ValueError(
+        f"Unknown latency distribution '{spec}', "
+        "e.g. fixed:0.05, uniform:0.02,0.2 or lognormal:0.05,0.6"
+    )
+
+
+def _business_days(first: str, last: str) -> int:
+    start = datetime.strptime(first.strip(), SIX_DATE_FORMAT).date()
+    end = datetime.strptime(last.strip(), SIX_DATE_FORMAT).date()
+    return sum(
+        1
+        for i in range((end - start).days + 1)
+        if (start + timedelta(days=i)).weekday() < 5
+    )
+
+
+@lru_cache(maxsize=256)
+def _ohlcv_body(query: str, first: str, last: str) -> bytes:
+    end = datetime.strptime(last.strip(), SIX_DATE_FORMAT).date()
+    n_bars = max(1, _business_days(first, last))
+    return ohlcv_envelope(
+        ohlcv_series(n_bars, end=end, seed=zlib.crc32(query.encode()))
+    )
+
+
+@lru_cache(maxsize=16)
+def _search_body(rows: int, columns: int) -> bytes:
+    return search_envelope(search_table(rows, columns))
+
+
+def create_app(
+    latency: str = "fixed:0.05",
+    error_rate: float = 0.0,
+    rows: int = 50,
+    columns: int = 8,
+) -> FastAPI:
+    delay = parse_latency(latency)
+    app = FastAPI(title="Fake SIX API")
+    app.state.stats = {"requests": 0, "errors": 0, "bytes": 0}
+
+    async def respond(body: Callable[[], bytes]) -> Response:
+        stats = app.state.stats
+        stats["requests"] += 1
+        await asyncio.sleep(delay())
+        if random.random() < error_rate:
+            stats["errors"] += 1
+            return Response(status_code=503)
+        content = body()
+        stats["bytes"] += len(content)
+        return Response(content=content, media_type="application/json")
+
+    @app.post("/ohlcv")
+    async def ohlcv(query: str, first: str, last: str):
+        return await respond(lambda: _ohlcv_body(query, first, last))
+
+    @app.post("/searchwithcriteria")
+    async def searchwithcriteria(query: str):
+        return await respond(lambda: _search_body(rows, columns))
+
+    return app
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class FakeSixServer:
+    """Runs the fake SIX app with uvicorn in a background thread."""
+
+    def __init__(self, port: int | None = None, **app_options):
+        self.port = port or free_port()
+        self.app = create_app(**app_options)
+        config = uvicorn.Config(
+            self.app, host="127.0.0.1", port=self.port, log_level="warning"
+        )
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(
+            target=self._server.run, name="fake-six", daemon=True
+        )
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    @property
+    def stats(self) -> dict:
+        return dict(self.app.state.stats)
+
+    def start(self):
+        self._thread.start()
+        while not self._server.started:
+            if not self._thread.is_alive():
+                raise RuntimeError(
+                    f"Fake SIX server could not start on port {self.port}"
+                )
+            time.sleep(0.01)
+
+    def stop(self):
+        self._server.should_exit = True
+        self._thread.join()
+
+    def __enter__(self) -> "FakeSixServer":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", default="fixed:0.05")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rows", type=int, default=50, help="Rows of a search result")
+    parser.add_argument(
+        "--columns", type=int, default=8, help="Columns of a search result"
+    )
+    args = parser.parse_args()
+    app = create_app(args.latency, args.error_rate, args.rows, args.columns)
+    uvicorn.run(app, host="127.0.0.1", port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Synthetic SIX API responses with the same nested envelope as the real API:
+
+    {"object": "{\"data\": ...}"}
+
+where `data` is a JSON string holding {"<id>": "<time series JSON>"} for /ohlcv
+and a list with one table JSON string for /searchwithcriteria.
+"""
+
+import json
+import random
+from datetime import date, timedelta
+
+
+def ohlcv_series(
+    n_bars: int, end: date | None = None, seed: int = 0
+) -> dict[str, dict]:
+    """Return `n_bars` business-day bars up to `end`, keyed like SIX time series."""
+    rng = random.Random(seed)
+    end = end or date.today() - timedelta(days=1)
+    days = []
+    day = end
+    while len(days) < n_bars:
+        if day.weekday() < 5:
+            days.append(day)
+        day -= timedelta(days=1)
+
+    series = {}
+    price = 100.0
+    for day in reversed(days):
+        open_ = price
+        close = max(1.0, open_ * (1 + rng.gauss(0, 0.015)))
+        series[f"{day.isoformat()}T00:00:00"] = {
+            "open": round(open_, 2),
+            "high": round(max(open_, close) * (1 + abs(rng.gauss(0, 0.005))), 2),
+            "low": round(min(open_, close) * (1 - abs(rng.gauss(0, 0.005))), 2),
+            "close": round(close, 2),
+            "vol": rng.randint(100_000, 20_000_000),
+        }
+        price = close
+    return series
+
+
+def ohlcv_envelope(series: dict[str, dict]) -> bytes:
+    data = json.dumps({"SIX_ID_1": json.dumps(series)})
+    return json.dumps({"object": json.dumps({"data": data})}).encode()
+
+
+def search_table(n_rows: int, n_columns: int, seed: int = 0) -> dict[str, dict]:
+    """Return a column-wise result table ({"column": {"0": value, ...}})."""
+    rng = random.Random(seed)
+    table = {
+        "Name": {str(i): f"Company {i} AG" for i in range(n_rows)},
+        "ISIN": {str(i): f"CH{rng.randint(10**9, 10**10 - 1)}" for i in range(n_rows)},
+    }
+    for column in range(n_columns - len(table)):
+        table[f"Fundamentals annual 1 - Metric {column}"] = {
+            str(i): round(rng.uniform(-1e4, 1e5), 3) for i in range(n_rows)
+        }
+    return table
+
+
+def search_envelope(table: dict[str, dict]) -> bytes:
+    return json.dumps({"object": json.dumps({"data": [json.dumps(table)]})}).encode()
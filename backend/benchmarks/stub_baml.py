@@ -0,0 +1,227 @@
+"""
+Stand-ins for the LLM and the SIX tools of generate_canvas, shared by the benchmarks.
+
+`StubBamlClient` replaces `baml_client.async_client.b`: it returns canned
+Canvas, Tool and ToolCanvas objects after delays drawn from latency
+distributions (see fake_six.py), and `stream.GenerateCanvas` emits the plan one
+tile at a time like baml_py.BamlStream.
+
+Canvases cycle through `tile_types` (LINE, CANDLE, TABLE by default). Each
+canvas gets one of `n_symbols` symbols derived from the prompt, so a benchmark
+can choose between repeated and distinct SIX requests; `namespace` keeps the
+symbols of different runs apart. OHLCV tool calls cover `n_bars` calendar days
+up to yesterday, which sets the size of the fake SIX responses, and search
+queries name the symbol of the canvas.
+
+`install_stubs` puts a client (and optionally stub SIX tools) in place of the
+real ones and disables everything that would let a canvas skip the stubs.
+
+Example Usage:
+
+from benchmarks.stub_baml import StubBamlClient, install_stubs, stub_tools
+
+install_stubs(StubBamlClient(n_tiles=3, plan_latency="lognormal:0.8,0.3"))
+install_stubs(
+    StubBamlClient(tile_types=(DiagramType.LINE,)), tools=stub_tools("fixed:1")
+)
+"""
+
+import asyncio
+import json
+import sys
+import time
+import zlib
+from datetime import date, timedelta
+from typing import Any, Callable
+
+from baml_client import partial_types
+from baml_client.types import (
+    Canvas,
+    DiagramType,
+    Tile,
+    Tool,
+    ToolCanvas,
+    ToolTile,
+    ToolType,
+)
+
+from benchmarks.fake_six import parse_latency
+
+TILE_TYPES = (DiagramType.LINE, DiagramType.CANDLE, DiagramType.TABLE)
+
+
+class StubPlanStream:
+    """Emits partial canvases like baml_py.BamlStream, one tile at a time."""
+
+    def __init__(self, tiles: list[Tile], delay: float):
+        self.tiles = tiles
+        self.delay = delay
+
+    async def __aiter__(self):
+        step = self.delay / len(self.tiles)
+        for count in range(1, len(self.tiles) + 1):
+            await asyncio.sleep(step)
+            done = [
+                partial_types.Tile(**t.model_dump()) for t in self.tiles[: count - 1]
+            ]
+            # The newest tile is still being written
+            writing = partial_types.Tile(title=self.tiles[count - 1].title)
+            yield partial_types.Canvas(tiles=done + [writing])
+
+    async def get_final_response(self) -> Canvas:
+        return Canvas(tiles=self.tiles)
+
+
+class _StubStreamClient:
+    def __init__(self, client: "StubBamlClient"):
+        self.client = client
+
+    def GenerateCanvas(
+        self, user_input: str, context: str, baml_options=None
+    ) -> StubPlanStream:
+        return StubPlanStream(self.client.plan(user_input), self.client.plan_delay())
+
+
+class StubBamlClient:
+    def __init__(
+        self,
+        n_tiles: int = 3,
+        plan_latency: str = "fixed:0.5",
+        tool_latency: str | None = None,
+        tile_types: tuple[DiagramType, ...] = TILE_TYPES,
+        n_symbols: int = 10,
+        n_bars: int = 365,
+        single_shot_factor: float = 1.0,
+        blocking: bool = False,
+    ):
+        """
+        `tool_latency` defaults to `plan_latency`. GenerateCanvasWithTools takes
+        `single_shot_factor` times a plan delay, and with `blocking` the plan
+        delays block the event loop like the old sync GenerateCanvas call.
+        """
+        self.n_tiles = n_tiles
+        self.plan_delay = parse_latency(plan_latency)
+        self.tool_delay = parse_latency(tool_latency or plan_latency)
+        self.tile_types = tile_types
+        self.n_symbols = n_symbols
+        self.n_bars = n_bars
+        self.single_shot_factor = single_shot_factor
+        self.blocking = blocking
+        self.namespace = ""
+        self.stream = _StubStreamClient(self)
+
+    def symbol(self, user_input: str) -> str:
+        return f"STUB{self.namespace}{zlib.crc32(user_input.encode()) % self.n_symbols}"
+
+    def plan(self, user_input: str) -> list[Tile]:
+        symbol = self.symbol(user_input)
+        return [
+            Tile(
+                title=f"{symbol} tile {i}",
+                type=self.tile_types[i % len(self.tile_types)],
+                content=symbol,
+            )
+            for i in range(self.n_tiles)
+        ]
+
+    def tool(self, type: str, description: str) -> Tool:
+        if type == DiagramType.TABLE.value:
+            query = json.dumps({"ebitda": "is positive", "name": description})
+            return Tool(type=ToolType.SEARCHWITHCRITERIA, inputs=[f"query={query}"])
+        last = date.today() - timedelta(days=1)
+        first = last - timedelta(days=self.n_bars)
+        return Tool(
+            type=ToolType.OHLCV,
+            inputs=[
+                f"symbol={description}",
+                f"first={first.strftime('%d.%m.%Y')}",
+                f"last={last.strftime('%d.%m.%Y')}",
+            ],
+        )
+
+    def tool_call_delay(self, title: str) -> float:
+        return self.tool_delay()
+
+    async def _wait_for_plan(self, delay: float):
+        if self.blocking:
+            time.sleep(delay)
+        else:
+            await asyncio.sleep(delay)
+
+    async def GenerateCanvas(
+        self, user_input: str, context: str, baml_options=None
+    ) -> Canvas:
+        await self._wait_for_plan(self.plan_delay())
+        return Canvas(tiles=self.plan(user_input))
+
+    async def GenerateToolCalls(
+        self, title, type, description, context, date, baml_options=None
+    ) -> Tool:
+        await asyncio.sleep(self.tool_call_delay(title))
+        return self.tool(type, description)
+
+    async def GenerateCanvasWithTools(
+        self, user_input: str, context: str, date: str, baml_options=None
+    ) -> ToolCanvas:
+        await self._wait_for_plan(self.plan_delay() * self.single_shot_factor)
+        return ToolCanvas(
+            tiles=[
+                ToolTile(
+                    **tile.model_dump(), tool=self.tool(tile.type.value, tile.content)
+                )
+                for tile in self.plan(user_input)
+            ]
+        )
+
+
+def stub_tools(fetch_latency: str = "fixed:0") -> dict[ToolType, Callable]:
+    """SIX tools that only wait, for benchmarks of the pipeline rather than SIX."""
+    delay = parse_latency(fetch_latency)
+
+    async def stub_ohlcv(symbol: str, first: str, last: str) -> list[dict]:
+        await asyncio.sleep(delay())
+        return []
+
+    async def stub_search(query: str) -> dict:
+        await asyncio.sleep(delay())
+        return {"Name": {"0": "Stub AG"}}
+
+    return {ToolType.OHLCV: stub_ohlcv, ToolType.SEARCHWITHCRITERIA: stub_search}
+
+
+def install_stubs(
+    client: Any,
+    tools: dict[ToolType, Callable] | None = None,
+    upstream_limits: bool = False,
+    archive: bool = False,
+):
+    """
+    Use `client` as the BAML client of generate_canvas and `tools` (if given) as
+    its SIX tools. The plan and tool-call caches are disabled, so every canvas
+    pays the stubbed LLM latency, and canvases are only saved with `archive`.
+    Unless `upstream_limits`, the per-upstream limiters are lifted: the
+    stand-ins need no protection and the benchmarks measure the pipeline, not
+    the limiters.
+    """
+    import generate_canvas as pipeline
+    from api.limiter import upstream_limiters
+
+    pipeline.b_async = client
+    if tools is not None:
+        pipeline.TOOLS = tools
+    if not archive:
+        pipeline.save_canvas = lambda *args, **kwargs: None
+        # functions.py imports save_canvas by name, if it is loaded already
+        functions = sys.modules.get("src.server.functions")
+        if functions is not None:
+            functions.save_canvas = pipeline.save_canvas
+    pipeline.tool_call_cache.max_size = 0
+    pipeline.canvas_plan_cache.max_size = 0
+    if not upstream_limits:
+        upstream_limiters.limits = {
+            name: {"max_concurrency": 1_000_000}
+            for name in (
+                pipeline.BAML_CLIENT,
+                *(tool_type.value for tool_type in ToolType),
+            )
+        }
@@ -1,23 +1,73 @@
-from fastapi import FastAPI, HTTPException, Depends, status, Header
-from src.server.models import InitialQuery
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Depends, status, Header, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from src.server.models import InitialQuery, CanvasDiffResponse
 from src.server.functions import (
     create_session,
-    get_session,
+    get_session_state,
+    get_session_version,
     session_exists,
-    trigger_workflow,
+    start_job,
+    wait_for_session_update,
+    stream_workflow,
+    list_history,
+    get_history_canvas,
+    open_history_canvas,
+    startup,
+    shutdown,
+    get_stats,
+    get_metrics,
 )
+from metrics import server_timings, server_timing_header
+from datetime import datetime
+from typing import Optional
 import uvicorn
 import time
 import logging
 
+# Longest a GET /canvas/{session_id}?wait= request is held open, in seconds
+MAX_WAIT_SECONDS = 30
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Shared HTTP connection pools live as long as the app
+    await startup()
+    yield
+    await shutdown()
+
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Canvas API",
     description="API for AssetIQ canvas operations with authentication",
+    lifespan=lifespan,
 )
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
 
+
+@app.middleware("http")
+async def add_server_timing(request: Request, call_next):
+    """
+    Report the stages of /canvas requests in a Server-Timing header. The
+    pipeline stages of a job are in its `timings` (GET /canvas/{session_id}),
+    the ones of a stream in its `timing` event (see metrics.py).
+    """
+    if not request.url.path.startswith("/canvas"):
+        return await call_next(request)
+    started_at = time.perf_counter()
+    timings = []
+    token = server_timings.set(timings)
+    try:
+        response = await call_next(request)
+    finally:
+        server_timings.reset(token)
+    total_ms = (time.perf_counter() - started_at) * 1000
+    response.headers["Server-Timing"] = server_timing_header(timings, total_ms)
+    return response
+
+
 # In-memory API key storage (replace with a database in production)
 # Pre-defined API keys for the example
 API_KEYS = {"8917239871289129389": {"user": "admin", "created_at": int(time.time())}}
@@ -33,30 +83,183 @@ async def verify_api_key(API_KEY: str = Header(...)):
     return API_KEYS[API_KEY]
 
 
-@app.post("/canvas")
+async def verify_metrics_key(
+    API_KEY: Optional[str] = Header(None), authorization: Optional[str] = Header(None)
+):
+    """Like verify_api_key, also accepts `Authorization: Bearer <key>` (Prometheus)."""
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() == "bearer" and token.strip() in API_KEYS:
+        return API_KEYS[token.strip()]
+    return await verify_api_key(API_KEY)
+
+
+@app.post("/canvas", status_code=status.HTTP_202_ACCEPTED)
 async def trigger_dashboard(
     commons: InitialQuery = Depends(), user=Depends(verify_api_key)
 ):
+    """Start the workflow in the background, poll GET /canvas/{session_id} for tiles."""
     session_id = commons.session_id
     prompt = commons.prompt
 
-    if not session_exists(session_id):
+    if not await session_exists(session_id):
         logging.info(f"Session {session_id} does not exist, creating a new session")
-        create_session(session_id)
+        await create_session(session_id)
 
-    await trigger_workflow(session_id, prompt)
+    job = await start_job(session_id, prompt, commons.mode)
     logging.info(f"Workflow triggered for session {session_id} with prompt: {prompt}")
+    return {"session_id": session_id, **job}
+
+
+@app.post("/canvas/stream")
+async def stream_dashboard(
+    commons: InitialQuery = Depends(), user=Depends(verify_api_key)
+):
+    """Like POST /canvas, but streams the plan and each tile as Server-Sent Events."""
+    session_id = commons.session_id
+    prompt = commons.prompt
+
+    if not await session_exists(session_id):
+        logging.info(f"Session {session_id} does not exist, creating a new session")
+        await create_session(session_id)
+
+    logging.info(f"Streaming workflow for session {session_id} with prompt: {prompt}")
+    return StreamingResponse(
+        stream_workflow(session_id, prompt, commons.mode),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def session_etag(session_id: str, version: int) -> str:
+    # The version is bumped on every change, the body of a URL only depends on it
+    return f'"{session_id}-{version}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if if_none_match is None:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+@app.get("/canvas/{session_id}", responses={200: {"model": CanvasDiffResponse}})
+async def get_session_canvas(
+    session_id: str,
+    wait: float = Query(0, ge=0, le=MAX_WAIT_SECONDS),
+    version: Optional[int] = None,
+    since: Optional[int] = Query(None, ge=0),
+    if_none_match: Optional[str] = Header(None),
+    user=Depends(verify_api_key),
+):
+    """
+    Return the tiles and job status of a session. With `wait`, the request is
+    held until the session changes (a tile lands or a job finishes), compared to
+    `version` (or `since`) from the previous response if given.
 
+    With `since`, only the tiles added after that version are returned, the
+    client appends them to the tiles it has. The response carries an ETag of the
+    session version, a matching If-None-Match is answered with 304 Not Modified
+    without building the body.
+    """
+    if not await session_exists(session_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Session not found, please reload the page",
+        )
 
-@app.get("/canvas/{session_id}")
-async def get_session_canvas(session_id: str, user=Depends(verify_api_key)):
-    if not session_exists(session_id):
+    await wait_for_session_update(
+        session_id, version if version is not None else since, wait
+    )
+    current = await get_session_version(session_id)
+    if current is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Session not found, please reload the page",
         )
+    etag = session_etag(session_id, current)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    state = await get_session_state(session_id, since)
+    if state is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Session not found, please reload the page",
+        )
+    # The tiles are stored serialized, the body is passed through as-is. The ETag
+    # was taken before, at worst it is older than the body and the next request
+    # gets a full answer instead of a 304.
+    return Response(content=state, media_type="application/json", headers=headers)
+
+
+@app.get("/history")
+async def list_canvas_history(
+    session_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    tile_type: Optional[str] = None,
+    symbol: Optional[str] = None,
+    prompt: Optional[str] = None,
+    before_id: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=500),
+    user=Depends(verify_api_key),
+):
+    """
+    List archived canvases, newest first, with a summary of their tiles but
+    without the tile data. Pass `next_before_id` as `before_id` for the next page.
+    """
+    canvases = await list_history(
+        session_id=session_id,
+        since=since.timestamp() if since else None,
+        until=until.timestamp() if until else None,
+        tile_type=tile_type,
+        symbol=symbol,
+        prompt=prompt,
+        before_id=before_id,
+        limit=limit,
+    )
+    next_before_id = canvases[-1]["id"] if len(canvases) == limit else None
+    return {"canvases": canvases, "next_before_id": next_before_id}
+
+
+@app.get("/history/{canvas_id}")
+async def get_canvas_history(canvas_id: int, user=Depends(verify_api_key)):
+    canvas = await get_history_canvas(canvas_id)
+    if canvas is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Canvas not found",
+        )
+    return canvas
+
+
+@app.post("/history/{canvas_id}/open")
+async def open_canvas_history(
+    canvas_id: int, session_id: str, user=Depends(verify_api_key)
+):
+    """Reopen an archived canvas in a session, without new LLM or SIX calls."""
+    state = await open_history_canvas(canvas_id, session_id)
+    if state is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Canvas not found",
+        )
+    return Response(content=state, media_type="application/json")
+
+
+@app.get("/stats")
+async def get_backend_stats(user=Depends(verify_api_key)):
+    return await get_stats()
+
 
-    return get_session(session_id)
+@app.get("/metrics")
+async def get_backend_metrics(user=Depends(verify_metrics_key)):
+    """
+    Stage latency histograms and LLM token/byte counters for Prometheus, which
+    authenticates with `authorization: {type: Bearer, credentials: <API key>}`.
+    """
+    return Response(content=get_metrics(), media_type="text/plain; version=0.0.4")
 
 
 # Run the application
@@ -0,0 +1,250 @@
+"""
+Indexed store for the customers' asset allocations.
+
+The allocations are loaded once into a dict keyed by the normalized customer
+name (case- and whitespace-insensitive), so a lookup is a single dict access
+without file I/O. If there is no exact match, the closest name above
+ALLOCATION_FUZZY_CUTOFF (difflib ratio) is used, e.g. "jon doe" -> "John Doe".
+Fuzzy matching only compares the names starting with the same FUZZY_PREFIX
+characters (bucketed at load time), not every customer.
+A watcher task started in the application lifespan checks the file's mtime
+every ALLOCATION_RELOAD_INTERVAL seconds and reloads it only when it changed.
+
+For portfolios with hundreds of thousands of customers, the allocations can be
+imported into an indexed SQLite file and served from there instead of memory:
+
+    cd backend/src
+    python -m api.allocations \\
+        ../res/asset_allocation.json ../res/asset_allocation.sqlite3
+
+Configuration (environment variables):
+    ASSET_ALLOCATION_PATH         JSON file {customer name: [{"asset", "allocation"}]}
+                                  (default res/asset_allocation.json in the backend).
+    ASSET_ALLOCATION_DB           SQLite file created with the command above, used
+                                  instead of the JSON file.
+    ALLOCATION_FUZZY_CUTOFF       Minimum similarity (0..1) of a fuzzy match
+                                  (default 0.8).
+    ALLOCATION_RELOAD_INTERVAL    Seconds between two mtime checks (default 5).
+
+Example Usage:
+
+from api.allocations import allocation_store
+
+allocation_store.get("john doe")
+"""
+
+import asyncio
+import difflib
+import json
+import logging
+import os
+import sqlite3
+import sys
+from typing import Any
+
+backend_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+DEFAULT_PATH = os.path.join(backend_path, "res", "asset_allocation.json")
+
+# Number of memoized fuzzy lookups, the memo is cleared when it is full
+FUZZY_MEMO_SIZE = 1024
+# Fuzzy matches are only searched among names starting with the same characters
+FUZZY_PREFIX = 2
+
+
+def normalize_name(name: str) -> str:
+    return " ".join(str(name).split()).casefold()
+
+
+def _mtime(path: str) -> float | None:
+    try:
+        return os.stat(path).st_mtime
+    except FileNotFoundError:
+        return None
+
+
+class AllocationStore:
+    """Allocations of all customers, held in memory."""
+
+    def __init__(self, path: str, fuzzy_cutoff: float = 0.8):
+        self.path = path
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self._index: dict[str, list[dict]] = {}
+        self._by_prefix: dict[str, list[str]] = {}  # fuzzy match candidates
+        self._fuzzy: dict[str, str | None] = {}  # memoized fuzzy matches
+        self._mtime: float | None = None
+        self.reloads = 0
+        self.fuzzy_hits = 0
+
+    def load(self):
+        mtime = _mtime(self.path)
+        with open(self.path, "r") as file:
+            data = json.load(file)
+        index = {normalize_name(name): allocation for name, allocation in data.items()}
+        by_prefix: dict[str, list[str]] = {}
+        for key in index:
+            by_prefix.setdefault(key[:FUZZY_PREFIX], []).append(key)
+        self._index, self._by_prefix = index, by_prefix
+        self._fuzzy = {}
+        self._mtime = mtime
+        self.reloads += 1
+        logging.info(
+            "Loaded asset allocations of %d customers from %s",
+            len(self._index),
+            self.path,
+        )
+
+    def changed(self) -> bool:
+        return self._mtime is None or _mtime(self.path) != self._mtime
+
+    async def reload_if_changed(self):
+        if self.changed():
+            await asyncio.to_thread(self.load)
+
+    def _match(self, key: str) -> str | None:
+        if key not in self._fuzzy:
+            if len(self._fuzzy) >= FUZZY_MEMO_SIZE:
+                self._fuzzy.clear()
+            candidates = self._by_prefix.get(key[:FUZZY_PREFIX], [])
+            matches = difflib.get_close_matches(
+                key, candidates, n=1, cutoff=self.fuzzy_cutoff
+            )
+            self._fuzzy[key] = matches[0] if matches else None
+        return self._fuzzy[key]
+
+    def get(self, customer_name: str) -> list[dict]:
+        """
+        Return the allocation of a customer.
+
+        Raises:
+            KeyError: If no customer name matches.
+        """
+        if self._mtime is None:
+            self.load()
+        key = normalize_name(customer_name)
+        allocation = self._index.get(key)
+        if allocation is None:
+            match = self._match(key)
+            if match is None:
+                raise KeyError(customer_name)
+            self.fuzzy_hits += 1
+            logging.info(
+                "Using asset allocation of '%s' for '%s'", match, customer_name
+            )
+            allocation = self._index[match]
+        return allocation
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "backend": "memory",
+            "customers": len(self._index),
+            "reloads": self.reloads,
+            "fuzzy_hits": self.fuzzy_hits,
+        }
+
+
+class SQLiteAllocationStore:
+    """Allocations served from an indexed SQLite file, for large portfolios."""
+
+    def __init__(self, db_path: str, fuzzy_cutoff: float = 0.8):
+        self.db_path = db_path
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self._db = sqlite3.connect(
+            f"file:{db_path}?mode=ro", uri=True, check_same_thread=False
+        )
+        self.fuzzy_hits = 0
+
+    async def reload_if_changed(self):
+        # Every lookup reads the file, changes are visible right away.
+        pass
+
+    def _match(self, key: str) -> str | None:
+        # Only names starting with the same characters are compared, not the table
+        prefix = key[:FUZZY_PREFIX]
+        candidates = [
+            name
+            for (name,) in self._db.execute(
+                "SELECT key FROM allocations WHERE key >= ? AND key < ?",
+                (prefix, prefix + "\uffff"),
+            )
+        ]
+        matches = difflib.get_close_matches(
+            key, candidates, n=1, cutoff=self.fuzzy_cutoff
+        )
+        return matches[0] if matches else None
+
+    def get(self, customer_name: str) -> list[dict]:
+        key = normalize_name(customer_name)
+        row = self._db.execute(
+            "SELECT allocation FROM allocations WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            match = self._match(key)
+            if match is None:
+                raise KeyError(customer_name)
+            self.fuzzy_hits += 1
+            logging.info(
+                "Using asset allocation of '%s' for '%s'", match, customer_name
+            )
+            row = self._db.execute(
+                "SELECT allocation FROM allocations WHERE key = ?", (match,)
+            ).fetchone()
+        return json.loads(row[0])
+
+    def stats(self) -> dict[str, Any]:
+        (count,) = self._db.execute("SELECT COUNT(*) FROM allocations").fetchone()
+        return {"backend": "sqlite", "customers": count, "fuzzy_hits": self.fuzzy_hits}
+
+
+def import_to_sqlite(json_path: str, db_path: str):
+    """Write the allocations of a JSON file into an indexed SQLite file."""
+    with open(json_path, "r") as file:
+        data = json.load(file)
+    db = sqlite3.connect(db_path)
+    with db:
+        db.execute("DROP TABLE IF EXISTS allocations")
+        db.execute(
+            "CREATE TABLE allocations "
+            "(key TEXT PRIMARY KEY, name TEXT, allocation TEXT) WITHOUT ROWID"
+        )
+        db.executemany(
+            "INSERT OR REPLACE INTO allocations VALUES (?, ?, ?)",
+            (
+                (normalize_name(name), name, json.dumps(allocation))
+                for name, allocation in data.items()
+            ),
+        )
+    db.close()
+    logging.info(
+        "Imported asset allocations of %d customers into %s", len(data), db_path
+    )
+
+
+async def run_allocation_watcher(store, interval: float):
+    """Reload the allocations whenever the file changed, until cancelled."""
+    while True:
+        try:
+            await store.reload_if_changed()
+        except (OSError, ValueError) as e:
+            # Keep serving the last good version, e.g. while the file is being written
+            logging.error("Could not reload asset allocations: %s", e)
+        await asyncio.sleep(interval)
+
+
+def create_allocation_store():
+    fuzzy_cutoff = float(os.getenv("ALLOCATION_FUZZY_CUTOFF", 0.8))
+    db_path = os.getenv("ASSET_ALLOCATION_DB")
+    if db_path:
+        return SQLiteAllocationStore(db_path, fuzzy_cutoff)
+    return AllocationStore(
+        os.getenv("ASSET_ALLOCATION_PATH", DEFAULT_PATH), fuzzy_cutoff
+    )
+
+
+RELOAD_INTERVAL = float(os.getenv("ALLOCATION_RELOAD_INTERVAL", 5))
+
+allocation_store = create_allocation_store()
+
+
+if __name__ == "__main__":
+    import_to_sqlite(sys.argv[1], sys.argv[2])
@@ -0,0 +1,132 @@
+"""
+Columnar representation of daily OHLCV series.
+
+Instead of one six-key dict per bar, a series is stored as NumPy arrays
+(t: dates, o/h/l/c/v: float64) and serialized as
+
+    {"t": ["2025-02-20", ...], "o": [...], "h": [...], "l": [...], "c": [...], ...}
+
+This keeps multi-year candle tiles compact in the OHLCV cache and in session
+storage, and avoids allocating a dict per bar when the tile is serialized.
+
+Example Usage:
+
+from api.columnar import OhlcvColumns
+
+series = OhlcvColumns.from_six(time_series_raw)
+series.slice(date(2024, 1, 1), date(2024, 12, 31)).to_dict()
+"""
+
+from datetime import date
+from operator import itemgetter
+from typing import Any
+
+import numpy as np
+from pydantic_core import core_schema
+
+FIELDS = ("o", "h", "l", "c", "v")
+
+# Keys of the SIX time series values and of the legacy row format, per column
+SIX_KEYS = {"o": "open", "h": "high", "l": "low", "c": "close", "v": "vol"}
+ROW_KEYS = {"o": "open", "h": "high", "l": "low", "c": "close", "v": "volume"}
+
+
+def _to_list(values: np.ndarray) -> list:
+    # JSON has no NaN, missing values are serialized as null
+    missing = np.isnan(values)
+    if missing.any():
+        return np.where(missing, None, values).tolist()
+    return values.tolist()
+
+
+class OhlcvColumns:
+    __slots__ = ("t", "o", "h", "l", "c", "v")
+
+    def __init__(self, t, o, h, l, c, v):
+        self.t = np.asarray(t, dtype="datetime64[D]")
+        self.o = np.asarray(o, dtype=np.float64)
+        self.h = np.asarray(h, dtype=np.float64)
+        self.l = np.asarray(l, dtype=np.float64)
+        self.c = np.asarray(c, dtype=np.float64)
+        self.v = np.asarray(v, dtype=np.float64)
+
+    @classmethod
+    def empty(cls) -> "OhlcvColumns":
+        return cls(*([] for _ in range(6)))
+
+    @classmethod
+    def from_six(cls, time_series_raw: dict[str, dict]) -> "OhlcvColumns":
+        """Build the columns straight from the decoded SIX time series."""
+        t = [timestamp[:10] for timestamp in time_series_raw]
+        # One (n, 5) float matrix, transposed so every column is contiguous; None is NaN
+        get_values = itemgetter(*(SIX_KEYS[f] for f in FIELDS))
+        matrix = np.array(
+            list(map(get_values, time_series_raw.values())), dtype=np.float64
+        )
+        series = cls(t, *matrix.reshape(-1, len(FIELDS)).T.copy())
+        return series if np.all(series.t[1:] > series.t[:-1]) else series._sorted()
+
+    def _sorted(self) -> "OhlcvColumns":
+        # np.unique sorts and keeps the last value of duplicated dates
+        reversed_t = self.t[::-1]
+        _, index = np.unique(reversed_t, return_index=True)
+        index = len(self.t) - 1 - index
+        return self._take(index)
+
+    def _take(self, index) -> "OhlcvColumns":
+        return OhlcvColumns(*(getattr(self, f)[index] for f in self.__slots__))
+
+    def __len__(self) -> int:
+        return len(self.t)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, f).nbytes for f in self.__slots__)
+
+    @property
+    def latest(self) -> date | None:
+        return self.t[-1].item() if len(self.t) else None
+
+    def merge(self, other: "OhlcvColumns") -> "OhlcvColumns":
+        """Combine two series, bars of `other` win on duplicated dates."""
+        if not len(self):
+            return other
+        if not len(other):
+            return self
+        combined = OhlcvColumns(
+            *(
+                np.concatenate((getattr(self, f), getattr(other, f)))
+                for f in self.__slots__
+            )
+        )
+        return combined._sorted()
+
+    def slice(self, first: date, last: date) -> "OhlcvColumns":
+        """Return the bars between `first` and `last` (inclusive) as views."""
+        lo = np.searchsorted(self.t, np.datetime64(first, "D"), side="left")
+        hi = np.searchsorted(self.t, np.datetime64(last, "D"), side="right")
+        return OhlcvColumns(*(getattr(self, f)[lo:hi] for f in self.__slots__))
+
+    def to_dict(self) -> dict[str, list]:
+        result = {"t": np.datetime_as_string(self.t, unit="D").tolist()}
+        for f in FIELDS:
+            result[f] = _to_list(getattr(self, f))
+        return result
+
+    def to_rows(self) -> list[dict]:
+        """Legacy rechart format: one dict per bar."""
+        columns = self.to_dict()
+        return [
+            {"name": t, **{ROW_KEYS[f]: columns[f][i] for f in FIELDS}}
+            for i, t in enumerate(columns["t"])
+        ]
+
+    @classmethod
+    def __get_pydantic_core_schema__(cls, source: Any, handler: Any):
+        # Lets DataTile hold the columns as-is and serialize them with to_dict().
+        return core_schema.is_instance_schema(
+            cls,
+            serialization=core_schema.plain_serializer_function_ser_schema(
+                lambda series: series.to_dict()
+            ),
+        )
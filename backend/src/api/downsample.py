@@ -0,0 +1,101 @@
+"""
+Downsampling of OHLCV series to the number of points a chart can show.
+
+A tile is a few hundred pixels wide, years of daily bars only cost payload
+and render time. Series longer than the target are reduced per tile type:
+
+- LINE: Largest-Triangle-Three-Buckets on the close. The bars keeping the
+  visual shape (peaks, troughs, turns) are selected, so the line looks the same.
+- CANDLE: resampled to weekly bars, or to monthly (or multi-month) bars if
+  there are still too many weeks. open is the first open, high the highest
+  high, low the lowest low, close the last close and volume the sum of the
+  period; the bar is dated on its first trading day.
+
+The input series is not modified, the OHLCV cache keeps the full resolution.
+
+Example Usage:
+
+from api.downsample import downsample
+
+downsample(series, "CANDLE", target_points=300)
+"""
+
+import math
+
+import numpy as np
+
+from api.columnar import OhlcvColumns
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, target: int) -> np.ndarray:
+    """Indices of the `target` points LTTB selects from (x, y), including both ends."""
+    n = len(x)
+    if target >= n or target < 3:
+        return np.arange(n)
+    # target - 2 buckets between the fixed first and last point, none of them empty
+    edges = np.linspace(1, n - 1, target - 1).astype(np.int64)
+    selected = np.empty(target, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(target - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_x, next_y = x[hi : edges[i + 2]].mean(), y[hi : edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[n - 1], y[n - 1]
+        # Twice the area of the triangle (previous point, candidate, next bucket mean)
+        area = np.abs(
+            (x[a] - next_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (next_y - y[a])
+        )
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def lttb(series: OhlcvColumns, target: int) -> OhlcvColumns:
+    """Keep the `target` bars that best preserve the shape of the close."""
+    # Bars without a close cannot be placed on the line
+    valid = np.flatnonzero(np.isfinite(series.c))
+    x = series.t[valid].astype(np.float64)
+    index = valid[lttb_indices(x, series.c[valid], target)]
+    return OhlcvColumns(*(getattr(series, f)[index] for f in OhlcvColumns.__slots__))
+
+
+def _aggregate(series: OhlcvColumns, period: np.ndarray) -> OhlcvColumns:
+    # The series is sorted by date, so every period is one contiguous run of bars
+    starts = np.flatnonzero(np.r_[True, period[1:] != period[:-1]])
+    ends = np.r_[starts[1:], len(period)] - 1
+    return OhlcvColumns(
+        series.t[starts],
+        series.o[starts],
+        np.fmax.reduceat(series.h, starts),
+        np.fmin.reduceat(series.l, starts),
+        series.c[ends],
+        np.add.reduceat(np.nan_to_num(series.v), starts),
+    )
+
+
+def resample(series: OhlcvColumns, target: int) -> OhlcvColumns:
+    """Aggregate to weekly bars, or to bars of as many months as `target` requires."""
+    days = series.t.astype(np.int64)
+    # 1970-01-01 was a Thursday, shifting by 3 days makes the weeks start on Monday
+    weeks = (days + 3) // 7
+    if weeks[-1] - weeks[0] + 1 <= target:
+        return _aggregate(series, weeks)
+    months = series.t.astype("datetime64[M]").astype(np.int64)
+    months_per_bar = math.ceil((months[-1] - months[0] + 1) / target)
+    # Counted from 1970-01, so quarters and half years start in January
+    return _aggregate(series, months // months_per_bar)
+
+
+def downsample(
+    series: OhlcvColumns, tile_type: str, target_points: int
+) -> OhlcvColumns:
+    """Reduce `series` to about `target_points` bars for a tile, 0 keeps every bar."""
+    if target_points <= 0 or len(series) <= target_points:
+        return series
+    if tile_type == "CANDLE":
+        return resample(series, target_points)
+    if tile_type == "LINE":
+        return lttb(series, target_points)
+    return series
@@ -0,0 +1,237 @@
+"""
+Adaptive concurrency and rate limits per upstream.
+
+Every upstream (a SIX tool or a BAML client) gets an `AdaptiveLimiter`: a
+semaphore bounding the requests in flight plus a token bucket bounding the
+request rate. Both limits adapt AIMD-style:
+
+- a successful request raises the concurrency limit by 1/limit (about +1 per
+  round trip) and the rate by 2% of its maximum, up to the configured values;
+- a throttled request (HTTP 429/503) or one slower than `target_latency` halves
+  both, at most once per second, so one burst of 429s counts as one signal.
+
+Requests over the limits wait in a queue instead of piling onto the upstream,
+so throughput degrades smoothly when it slows down. Queue depth, limits and
+counters are exported via `stats()` (see GET /stats).
+
+Configuration (environment variables):
+    UPSTREAM_LIMITS   JSON merged over DEFAULT_LIMITS, e.g.
+                      '{"OHLCV": {"max_concurrency": 8, "rate": 5},
+                        "CustomGemini2Flash": {"rate": 30}}'.
+                      Keys: max_concurrency, min_concurrency, rate (requests/s,
+                      null for no limit), burst, target_latency (seconds, null
+                      to ignore latency).
+
+Example Usage:
+
+from api.limiter import upstream_limiters
+
+async with upstream_limiters.get("OHLCV").slot():
+    response = await six_post(url)
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator
+
+# Limits per SIX tool (ToolType value) and per BAML client
+DEFAULT_LIMITS: dict[str, dict[str, Any]] = {
+    "OHLCV": {"max_concurrency": 16, "rate": 20.0, "target_latency": 5.0},
+    "SEARCHWITHCRITERIA": {"max_concurrency": 8, "rate": 10.0, "target_latency": 5.0},
+    "CustomGemini2Flash": {"max_concurrency": 16, "rate": 10.0},
+}
+
+THROTTLE_STATUS_CODES = (429, 503)
+# Minimum seconds between two decreases
+DECREASE_COOLDOWN = 1.0
+
+
+def is_throttled(error: BaseException) -> bool:
+    """True for HTTP 429/503 errors (httpx.HTTPStatusError and BamlClientHttpError)."""
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(error, "response", None), "status_code", None)
+    return status_code in THROTTLE_STATUS_CODES
+
+
+class AdaptiveLimiter:
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int = 16,
+        min_concurrency: int = 1,
+        rate: float | None = None,
+        burst: float | None = None,
+        target_latency: float | None = None,
+    ):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.limit = float(max_concurrency)
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate or 1.0)
+        self.target_latency = target_latency
+        self._tokens = self.burst
+        self._refilled_at = time.monotonic()
+        self._decreased_at = 0.0
+        self._in_flight = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        self._queued = 0
+        self.max_queue_depth = 0
+        self.requests = 0
+        self.throttled = 0
+        self.slow = 0
+        self.wait_seconds_total = 0.0
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Wait for a free slot and a token, then run the request inside the block."""
+        queued_at = time.monotonic()
+        self._queued += 1
+        self.max_queue_depth = max(self.max_queue_depth, self._queued)
+        try:
+            await self._acquire_slot()
+            try:
+                await self._acquire_token()
+            except BaseException:
+                self._release_slot()
+                raise
+        finally:
+            self._queued -= 1
+
+        started_at = time.monotonic()
+        self.wait_seconds_total += started_at - queued_at
+        self.requests += 1
+        try:
+            yield
+        except Exception as e:
+            if is_throttled(e):
+                self.throttled += 1
+                self._decrease("throttled")
+            raise
+        else:
+            self._on_success(time.monotonic() - started_at)
+        finally:
+            self._release_slot()
+
+    def has_capacity(self) -> bool:
+        """True if a request would get a slot and a token without waiting."""
+        if self._waiters or self._in_flight >= int(self.limit):
+            return False
+        if self.rate is None:
+            return True
+        refill = (time.monotonic() - self._refilled_at) * self.rate
+        return min(self.burst, self._tokens + refill) >= 1
+
+    async def _acquire_slot(self):
+        if self._in_flight < int(self.limit) and not self._waiters:
+            self._in_flight += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just before the cancellation
+                self._release_slot()
+            elif future in self._waiters:
+                self._waiters.remove(future)
+            raise
+
+    def _release_slot(self):
+        self._in_flight -= 1
+        self._wake()
+
+    def _wake(self):
+        while self._waiters and self._in_flight < int(self.limit):
+            future = self._waiters.popleft()
+            if not future.done():
+                self._in_flight += 1
+                future.set_result(None)
+
+    async def _acquire_token(self):
+        if self.rate is None:
+            return
+        while True:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._refilled_at) * self.rate
+            )
+            self._refilled_at = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def _on_success(self, latency: float):
+        if self.target_latency is not None and latency > self.target_latency:
+            self.slow += 1
+            self._decrease("slow")
+            return
+        self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+        if self.rate is not None:
+            self.rate = min(self.max_rate, self.rate + 0.02 * self.max_rate)
+        self._wake()
+
+    def _decrease(self, reason: str):
+        now = time.monotonic()
+        if now - self._decreased_at < DECREASE_COOLDOWN:
+            return
+        self._decreased_at = now
+        self.limit = max(float(self.min_concurrency), self.limit / 2)
+        if self.rate is not None:
+            self.rate = max(0.05 * self.max_rate, self.rate / 2)
+        logging.warning(
+            "Upstream %s %s, limits lowered to %d in flight and %s requests/s",
+            self.name,
+            reason,
+            int(self.limit),
+            f"{self.rate:.1f}" if self.rate else "unlimited",
+        )
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "limit": int(self.limit),
+            "rate": self.rate,
+            "in_flight": self._in_flight,
+            "queue_depth": self._queued,
+            "max_queue_depth": self.max_queue_depth,
+            "requests": self.requests,
+            "throttled": self.throttled,
+            "slow": self.slow,
+            "wait_seconds_total": round(self.wait_seconds_total, 3),
+        }
+
+
+class LimiterRegistry:
+    def __init__(self, limits: dict[str, dict[str, Any]]):
+        self.limits = limits
+        self._limiters: dict[str, AdaptiveLimiter] = {}
+
+    def get(self, name: str) -> AdaptiveLimiter:
+        limiter = self._limiters.get(name)
+        if limiter is None:
+            limiter = self._limiters[name] = AdaptiveLimiter(
+                name, **self.limits.get(name, {})
+            )
+        return limiter
+
+    def stats(self) -> dict[str, Any]:
+        return {name: limiter.stats() for name, limiter in self._limiters.items()}
+
+
+def _load_limits() -> dict[str, dict[str, Any]]:
+    limits = {name: dict(config) for name, config in DEFAULT_LIMITS.items()}
+    for name, config in json.loads(os.getenv("UPSTREAM_LIMITS", "{}")).items():
+        limits.setdefault(name, {}).update(config)
+    return limits
+
+
+upstream_limiters = LimiterRegistry(_load_limits())
@@ -0,0 +1,247 @@
+"""
+Range-aware cache for daily OHLCV bars.
+
+Bars are cached per normalized symbol together with the date spans that have
+already been fetched from SIX. A request is served from the cached bars and only
+the missing spans (e.g. the new days since the last fetch) go upstream.
+Historical bars never expire. The most recent bar of a symbol is re-fetched
+once it is older than OHLCV_CACHE_TAIL_TTL seconds, since the current day can
+still change, but only while it is live: the bar of the last trading day before
+today or later. The last bar of a purely historical series is final.
+
+If some spans of a request fail upstream, the bars of the other spans are still
+cached before the error is raised, so a retry only asks for the failed spans.
+
+Configuration (environment variables):
+    OHLCV_CACHE_TAIL_TTL      Seconds the most recent bar stays fresh (default 300).
+    OHLCV_CACHE_MAX_SYMBOLS   Number of symbols kept, least recently used are evicted
+                              (default 1000).
+
+Example Usage:
+
+from api.ohlcv_cache import ohlcv_cache
+
+bars = await ohlcv_cache.fetch("NVIDIA", "01.01.2020", "01.01.2021", fetcher)
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Awaitable, Callable
+
+from api.columnar import OhlcvColumns
+
+# Date format used by the SIX API and the tool calls
+DATE_FORMAT = "%d.%m.%Y"
+
+Fetcher = Callable[[str, str, str], Awaitable[OhlcvColumns]]
+
+
+def normalize_symbol(symbol: str) -> str:
+    return " ".join(symbol.split()).casefold()
+
+
+def parse_date(value: str) -> date:
+    return datetime.strptime(value.strip(), DATE_FORMAT).date()
+
+
+# Weekdays allowed between a live tail and today, one covers a holiday
+LIVE_TAIL_WEEKDAYS = 1
+
+
+def _is_live(latest: date, today: date) -> bool:
+    """Whether `latest` is recent enough for its bar to change or be followed."""
+    weekdays = 0
+    day = latest + timedelta(days=1)
+    while day < today:
+        if day.weekday() < 5:
+            weekdays += 1
+            if weekdays > LIVE_TAIL_WEEKDAYS:
+                return False
+        day += timedelta(days=1)
+    return True
+
+
+def _has_weekday(start: date, end: date) -> bool:
+    # Daily bars only exist for trading days, a weekend-only span has nothing to fetch.
+    days = min((end - start).days + 1, 7)
+    return any((start + timedelta(days=i)).weekday() < 5 for i in range(days))
+
+
+class _SymbolBars:
+    __slots__ = ("series", "covered", "tail_checked_at")
+
+    def __init__(self):
+        self.series = OhlcvColumns.empty()
+        self.covered: list[tuple[date, date]] = []  # sorted, non-overlapping spans
+        self.tail_checked_at = 0.0
+
+    @property
+    def latest(self) -> date | None:
+        return self.series.latest
+
+    def missing(self, first: date, last: date) -> list[tuple[date, date]]:
+        """Return the sub-spans of [first, last] that are not covered yet."""
+        spans = []
+        cursor = first
+        for start, end in self.covered:
+            if end < cursor:
+                continue
+            if start > last:
+                break
+            if start > cursor:
+                spans.append((cursor, start - timedelta(days=1)))
+            cursor = max(cursor, end + timedelta(days=1))
+            if cursor > last:
+                break
+        if cursor <= last:
+            spans.append((cursor, last))
+        return spans
+
+    def cover(self, first: date, last: date):
+        spans = sorted(self.covered + [(first, last)])
+        merged = [spans[0]]
+        for start, end in spans[1:]:
+            prev_start, prev_end = merged[-1]
+            if start <= prev_end + timedelta(days=1):
+                merged[-1] = (prev_start, max(prev_end, end))
+            else:
+                merged.append((start, end))
+        self.covered = merged
+
+    def add(self, bars: OhlcvColumns):
+        self.series = self.series.merge(bars)
+
+
+class OhlcvCache:
+    def __init__(self, tail_ttl: float = 300.0, max_symbols: int = 1000):
+        self.tail_ttl = tail_ttl
+        self.max_symbols = max_symbols
+        self._symbols: OrderedDict[str, _SymbolBars] = OrderedDict()
+        self.hits = 0
+        self.partial_hits = 0
+        self.misses = 0
+        self.upstream_calls = 0
+
+    def _entry(self, symbol: str) -> _SymbolBars:
+        key = normalize_symbol(symbol)
+        entry = self._symbols.get(key)
+        if entry is None:
+            entry = self._symbols[key] = _SymbolBars()
+            while len(self._symbols) > self.max_symbols:
+                self._symbols.popitem(last=False)
+        else:
+            self._symbols.move_to_end(key)
+        return entry
+
+    def _spans_to_fetch(self, entry: _SymbolBars, first: date, last: date):
+        spans = entry.missing(first, last)
+        latest = entry.latest
+        tail_stale = time.monotonic() - entry.tail_checked_at > self.tail_ttl
+        if (
+            latest is not None
+            and tail_stale
+            and first <= latest <= last
+            and _is_live(latest, date.today())
+        ):
+            # Re-check the most recent bar and everything after it.
+            before_tail = []
+            for start, end in spans:
+                if start < latest:
+                    before_tail.append((start, min(end, latest - timedelta(days=1))))
+            spans = before_tail + [(latest, last)]
+        return [(s, e) for s, e in spans if _has_weekday(s, e)], spans
+
+    async def fetch(
+        self, symbol: str, first: str, last: str, fetcher: Fetcher
+    ) -> OhlcvColumns:
+        """
+        Return the bars of `symbol` between `first` and `last` (dd.mm.yyyy),
+        calling `fetcher(symbol, first, last)` only for spans not in the cache.
+
+        Raises:
+            ValueError: If a date is not in the dd.mm.yyyy format.
+            Exception: The error of the first failed span, after the bars of
+                the other spans have been cached.
+        """
+        first_date = parse_date(first)
+        # Days in the future cannot be cached as covered, there is no data yet.
+        last_date = min(parse_date(last), date.today())
+        if last_date < first_date:
+            return OhlcvColumns.empty()
+
+        entry = self._entry(symbol)
+        to_fetch, missing = self._spans_to_fetch(entry, first_date, last_date)
+
+        if not to_fetch:
+            self.hits += 1
+        elif len(to_fetch) == 1 and to_fetch[0] == (first_date, last_date):
+            self.misses += 1
+        else:
+            self.partial_hits += 1
+
+        results = []
+        if to_fetch:
+            logging.info("OHLCV cache for %s: fetching %s", symbol, to_fetch)
+            self.upstream_calls += len(to_fetch)
+            results = await asyncio.gather(
+                *(
+                    fetcher(
+                        symbol, start.strftime(DATE_FORMAT), end.strftime(DATE_FORMAT)
+                    )
+                    for start, end in to_fetch
+                ),
+                return_exceptions=True,
+            )
+            fetched = []
+            for span, result in zip(to_fetch, results):
+                if not isinstance(result, BaseException):
+                    entry.add(result)
+                    fetched.append(span)
+            if entry.latest is not None and any(
+                end >= entry.latest for _, end in fetched
+            ):
+                entry.tail_checked_at = time.monotonic()
+
+        # Weekend-only spans are covered without asking upstream, failed spans
+        # are asked again by the next request.
+        failed = {
+            span
+            for span, result in zip(to_fetch, results)
+            if isinstance(result, BaseException)
+        }
+        for start, end in missing:
+            if (start, end) not in failed:
+                entry.cover(start, end)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+        return entry.series.slice(first_date, last_date)
+
+    def cached(self, symbol: str, first: str, last: str) -> OhlcvColumns:
+        """Return the bars already in the cache, without going upstream."""
+        entry = self._symbols.get(normalize_symbol(symbol))
+        if entry is None:
+            return OhlcvColumns.empty()
+        return entry.series.slice(parse_date(first), parse_date(last))
+
+    def stats(self) -> dict:
+        return {
+            "symbols": len(self._symbols),
+            "bars": sum(len(entry.series) for entry in self._symbols.values()),
+            "bytes": sum(entry.series.nbytes for entry in self._symbols.values()),
+            "hits": self.hits,
+            "partial_hits": self.partial_hits,
+            "misses": self.misses,
+            "upstream_calls": self.upstream_calls,
+        }
+
+
+ohlcv_cache = OhlcvCache(
+    tail_ttl=float(os.getenv("OHLCV_CACHE_TAIL_TTL", 300)),
+    max_symbols=int(os.getenv("OHLCV_CACHE_MAX_SYMBOLS", 1000)),
+)
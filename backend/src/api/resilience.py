@@ -0,0 +1,324 @@
+"""
+Deadlines, hedged requests and circuit breaking for the SIX API.
+
+`six_call(upstream, url)` wraps `six_post` with:
+
+- Limits: the call first waits for a slot of the upstream limiter (see
+  limiter.py), at most until the canvas deadline. Time spent in that queue
+  is not request latency: the timeout, the latency samples and the hedge
+  delay only start once the request is sent.
+- Deadline: generate_canvas sets a deadline of CANVAS_BUDGET seconds for the
+  whole canvas (`canvas_deadline`). Every attempt gets at most SIX_CALL_TIMEOUT
+  seconds and never more than what is left of the canvas budget, so one slow
+  response cannot stall the canvas.
+- Hedging: if an attempt has not answered after the p95 latency of the recent
+  successful requests of the upstream, one duplicate request is sent and the
+  first response wins, the other attempt is cancelled. The SIX endpoints only
+  read data, duplicates are safe. A hedge is only sent if the limiter has a
+  free slot right away, so hedges never queue behind other calls.
+- Circuit breaker: after SIX_BREAKER_FAILURES consecutive failures (timeouts,
+  transport errors, HTTP 429/5xx) the breaker opens and calls fail fast with
+  CircuitOpenError for SIX_BREAKER_RESET seconds. Then a single probe request
+  decides whether it closes again. call_ohlcv serves cached bars meanwhile.
+
+Configuration (environment variables):
+    CANVAS_BUDGET             Seconds a whole canvas may take (default 45).
+    SIX_CALL_TIMEOUT          Maximum seconds of a single SIX request (default 10).
+    SIX_HEDGE                 "0" disables hedged requests (default "1").
+    SIX_HEDGE_DELAY           Hedge delay while there are too few latency samples
+                              (default 2).
+    SIX_HEDGE_MIN_DELAY       Lower bound of the p95-based hedge delay (default 0.05).
+    SIX_BREAKER_FAILURES      Consecutive failures that open the breaker (default 5).
+    SIX_BREAKER_RESET         Seconds the breaker stays open (default 30).
+
+Example Usage:
+
+from api.resilience import canvas_deadline_scope, six_call
+
+with canvas_deadline_scope():
+    response = await six_call("OHLCV", url)
+"""
+
+import asyncio
+import contextvars
+import logging
+import os
+import time
+from collections import deque
+from contextlib import AsyncExitStack, asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Iterator
+
+import httpx
+
+from api.limiter import upstream_limiters
+from api.six_client import six_post
+
+CANVAS_BUDGET = float(os.getenv("CANVAS_BUDGET", 45))
+SIX_CALL_TIMEOUT = float(os.getenv("SIX_CALL_TIMEOUT", 10))
+SIX_HEDGE = os.getenv("SIX_HEDGE", "1") == "1"
+SIX_HEDGE_DELAY = float(os.getenv("SIX_HEDGE_DELAY", 2))
+SIX_HEDGE_MIN_DELAY = float(os.getenv("SIX_HEDGE_MIN_DELAY", 0.05))
+SIX_BREAKER_FAILURES = int(os.getenv("SIX_BREAKER_FAILURES", 5))
+SIX_BREAKER_RESET = float(os.getenv("SIX_BREAKER_RESET", 30))
+
+# Latency samples needed before the hedge delay follows the p95
+MIN_LATENCY_SAMPLES = 20
+
+# Absolute time.monotonic() by which the current canvas has to be done
+canvas_deadline: contextvars.ContextVar[float | None] = contextvars.ContextVar(
+    "canvas_deadline", default=None
+)
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    pass
+
+
+class BudgetExhausted(DeadlineExceeded):
+    """The canvas ran out of time, which says nothing about the upstream's health."""
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+@contextmanager
+def canvas_deadline_scope(budget: float = CANVAS_BUDGET) -> Iterator[float]:
+    """Set the deadline of the current context to `budget` seconds from now."""
+    deadline = time.monotonic() + budget
+    token = canvas_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        canvas_deadline.reset(token)
+
+
+def remaining_budget() -> float | None:
+    deadline = canvas_deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def call_timeout() -> float:
+    """Seconds the next attempt may take, bounded by the canvas deadline."""
+    remaining = remaining_budget()
+    if remaining is None:
+        return SIX_CALL_TIMEOUT
+    if remaining <= 0:
+        raise BudgetExhausted("Canvas budget exhausted")
+    return min(SIX_CALL_TIMEOUT, remaining)
+
+
+def is_failure(error: BaseException) -> bool:
+    """Errors that indicate an unhealthy upstream, as opposed to a bad request."""
+    if isinstance(error, BudgetExhausted):
+        return False
+    if isinstance(error, (asyncio.TimeoutError, httpx.TransportError)):
+        return True
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    return False
+
+
+class LatencyTracker:
+    def __init__(self, size: int = 200):
+        self._samples: deque[float] = deque(maxlen=size)
+
+    def add(self, seconds: float):
+        self._samples.append(seconds)
+
+    def p95(self) -> float | None:
+        if len(self._samples) < MIN_LATENCY_SAMPLES:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+    def hedge_delay(self) -> float:
+        p95 = self.p95()
+        return SIX_HEDGE_DELAY if p95 is None else max(SIX_HEDGE_MIN_DELAY, p95)
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._probing = False
+        self.rejected = 0
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return "open"
+        return "half_open"
+
+    def before_call(self):
+        """Raise CircuitOpenError unless the call may go upstream."""
+        state = self.state
+        if state == "closed":
+            return
+        if state == "half_open" and not self._probing:
+            # Let exactly one probe through
+            self._probing = True
+            return
+        self.rejected += 1
+        raise CircuitOpenError(f"SIX {self.name} is unavailable, circuit open")
+
+    def on_success(self):
+        if self.opened_at is not None:
+            logging.info("Circuit for SIX %s closed", self.name)
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def on_failure(self):
+        self.failures += 1
+        if self._probing or self.failures >= self.failure_threshold:
+            if self.opened_at is None or self._probing:
+                self.trips += 1
+                logging.warning(
+                    "Circuit for SIX %s opened after %d failures",
+                    self.name,
+                    self.failures,
+                )
+            self.opened_at = time.monotonic()
+            self._probing = False
+
+    def on_neutral(self):
+        # A call that says nothing about the health (e.g. cancelled) ends a probe
+        self._probing = False
+
+
+class Upstream:
+    """Latency history, breaker and counters of one SIX endpoint."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.latency = LatencyTracker()
+        self.breaker = CircuitBreaker(name, SIX_BREAKER_FAILURES, SIX_BREAKER_RESET)
+        self.timeouts = 0
+        self.hedges = 0
+        self.hedges_won = 0
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "state": self.breaker.state,
+            "trips": self.breaker.trips,
+            "rejected": self.breaker.rejected,
+            "p95_seconds": self.latency.p95(),
+            "hedge_delay_seconds": self.latency.hedge_delay(),
+            "hedges": self.hedges,
+            "hedges_won": self.hedges_won,
+            "timeouts": self.timeouts,
+        }
+
+
+_upstreams: dict[str, Upstream] = {}
+
+
+def get_upstream(name: str) -> Upstream:
+    if name not in _upstreams:
+        _upstreams[name] = Upstream(name)
+    return _upstreams[name]
+
+
+@asynccontextmanager
+async def _slot(upstream: Upstream) -> AsyncIterator[None]:
+    """Hold a limiter slot of `upstream`, waiting at most until the canvas deadline."""
+    async with AsyncExitStack() as stack:
+        slot = upstream_limiters.get(upstream.name).slot()
+        try:
+            await asyncio.wait_for(stack.enter_async_context(slot), remaining_budget())
+        except asyncio.TimeoutError:
+            # Still queued, nothing was sent, so this says nothing about the upstream
+            raise BudgetExhausted(
+                f"Canvas budget exhausted waiting for SIX {upstream.name}"
+            )
+        yield
+
+
+async def _attempt(upstream: Upstream, url: str) -> httpx.Response:
+    """Send one request, on a limiter slot the caller already holds."""
+    timeout = call_timeout()
+    started_at = time.monotonic()
+    try:
+        response = await asyncio.wait_for(six_post(url), timeout)
+    except asyncio.TimeoutError:
+        upstream.timeouts += 1
+        message = f"SIX {upstream.name} did not answer within {timeout:.1f}s"
+        if timeout < SIX_CALL_TIMEOUT:
+            raise BudgetExhausted(message)
+        raise DeadlineExceeded(message)
+    upstream.latency.add(time.monotonic() - started_at)
+    return response
+
+
+async def _hedge_attempt(upstream: Upstream, url: str) -> httpx.Response:
+    async with _slot(upstream):
+        return await _attempt(upstream, url)
+
+
+async def _hedged(upstream: Upstream, url: str) -> httpx.Response:
+    first = asyncio.ensure_future(_attempt(upstream, url))
+    tasks = [first]
+    try:
+        delay = upstream.latency.hedge_delay()
+        remaining = remaining_budget()
+        if SIX_HEDGE and (remaining is None or remaining > delay):
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done and upstream_limiters.get(upstream.name).has_capacity():
+                upstream.hedges += 1
+                logging.info("Hedging SIX %s request after %.2fs", upstream.name, delay)
+                tasks.append(asyncio.ensure_future(_hedge_attempt(upstream, url)))
+
+        error: BaseException | None = None
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task.exception() is None:
+                    if task is not first:
+                        upstream.hedges_won += 1
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def six_call(upstream_name: str, url: str) -> httpx.Response:
+    """
+    POST to a SIX endpoint with deadline, hedging and circuit breaker.
+
+    Raises:
+        CircuitOpenError: If the endpoint is failing and the breaker is open.
+        DeadlineExceeded: If no answer arrived in time.
+        httpx.HTTPError: For transport errors and error statuses.
+    """
+    upstream = get_upstream(upstream_name)
+    upstream.breaker.before_call()
+    try:
+        async with _slot(upstream):
+            response = await _hedged(upstream, url)
+    except asyncio.CancelledError:
+        upstream.breaker.on_neutral()
+        raise
+    except Exception as e:
+        if is_failure(e):
+            upstream.breaker.on_failure()
+        else:
+            upstream.breaker.on_neutral()
+        raise
+    upstream.breaker.on_success()
+    return response
+
+
+def resilience_stats() -> dict[str, Any]:
+    return {name: upstream.stats() for name, upstream in _upstreams.items()}
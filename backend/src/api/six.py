@@ -9,11 +9,12 @@ call_searchwithcriteria('{"ebitda": "is positive", "employees": "more than 10000
 """
 
 import requests
+import asyncio
+import httpx
 import json
 import logging
 import os
 import sys
-import httpx
 
 backend_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
 sys.path.append(backend_path)
@@ -28,8 +29,19 @@ logging.basicConfig(
 
 logging.debug("Logging setup complete.")
 
+from api.six_client import SIX_BASE_URL
+from api.ohlcv_cache import ohlcv_cache, parse_date
+from api.columnar import OhlcvColumns
+from api.six_decode import decode_ohlcv, decode_search
+from api.allocations import allocation_store
+from api.resilience import CircuitOpenError, six_call
+
+# Opt-in: return OHLCV tiles as columns ({"t": [...], "o": [...], ...}) instead of one
+# dict per bar
+OHLCV_COLUMNAR = os.getenv("OHLCV_COLUMNAR", "0") == "1"
+
 
-async def call_ohlcv(symbol: str, first: str, last: str) -> list[dict]:
+async def call_ohlcv(symbol: str, first: str, last: str) -> list[dict] | OhlcvColumns:
     """
     Retrieve historical OHLCV data for a given company.
 
@@ -43,44 +55,57 @@ async def call_ohlcv(symbol: str, first: str, last: str) -> list[dict]:
             If provided, data will be fetched up to this date.
 
     Returns:
-        dict: A dictionary containing the JSON response from the API with the historical data.
+        list[dict] | OhlcvColumns: One dict per bar (name, open, high, low, close,
+            volume), or the columnar series if OHLCV_COLUMNAR is enabled.
 
     """
+    return ohlcv_payload(await fetch_ohlcv_series(symbol, first, last))
+
+
+async def fetch_ohlcv_series(symbol: str, first: str, last: str) -> OhlcvColumns:
+    """Like call_ohlcv, but always returns the full-resolution columnar series."""
+    try:
+        parse_date(first), parse_date(last)
+    except ValueError as e:
+        # Dates the cache cannot interpret are passed through to SIX unchanged.
+        logging.warning(
+            "Bypassing OHLCV cache for %s, %s, %s: %s", symbol, first, last, e
+        )
+        series = await _fetch_ohlcv(symbol, first, last)
+    else:
+        try:
+            series = await ohlcv_cache.fetch(symbol, first, last, _fetch_ohlcv)
+        except (CircuitOpenError, asyncio.TimeoutError, httpx.HTTPError) as e:
+            # SIX is unhealthy, serve the cached bars (possibly stale or incomplete)
+            series = ohlcv_cache.cached(symbol, first, last)
+            if not len(series):
+                raise
+            logging.warning(
+                "Serving cached OHLCV data for %s after SIX error: %s", symbol, e
+            )
+
+    return series
+
+
+def ohlcv_payload(series: OhlcvColumns) -> list[dict] | OhlcvColumns:
+    """The series in the format sent to clients, see OHLCV_COLUMNAR."""
+    return series if OHLCV_COLUMNAR else series.to_rows()
+
+
+async def _fetch_ohlcv(symbol: str, first: str, last: str) -> OhlcvColumns:
     # Get data from six api
-    url = (
-        "https://idchat-api-containerapp01-dev.orangepebble-16234c4b."
-        "switzerlandnorth.azurecontainerapps.io//ohlcv"
-        f"?query={symbol}&first={first}&last={last}"
-    )
+    url = f"{SIX_BASE_URL}/ohlcv?query={symbol}&first={first}&last={last}"
     logging.info("Request SIX API for OHLCV with: %s, %s, %s", symbol, first, last)
     logging.info("URL: %s", url)
-    async with httpx.AsyncClient() as client:
-        response = await client.post(url)
-        response_json = response.json()
+    response = await six_call("OHLCV", url)
     logging.info("Response from SIX API for OHLCV: %s", response)
 
     # Unpack data
-    obj = json.loads(response_json["object"])
-    data = json.loads(obj["data"])
-    time_series_raw = json.loads(list(data.values())[0])
-
-    # Convert time series to rechart format
-    time_series = []
-    for timestamp, values in time_series_raw.items():
-        date_only = timestamp.split("T")[0]
-
-        time_series.append(
-            {
-                "name": date_only,
-                "open": values["open"],
-                "high": values["high"],
-                "low": values["low"],
-                "close": values["close"],
-                "volume": values["vol"],
-            }
-        )
+    time_series_raw = decode_ohlcv(response.content)
+    if not time_series_raw:
+        return OhlcvColumns.empty()
 
-    return time_series
+    return OhlcvColumns.from_six(time_series_raw)
 
 
 async def call_searchwithcriteria(query: str) -> dict:
@@ -148,32 +173,24 @@ async def call_searchwithcriteria(query: str) -> dict:
         query = json.dumps(query)
 
     # Get data from six api
-    url = (
-        "https://idchat-api-containerapp01-dev.orangepebble-16234c4b."
-        "switzerlandnorth.azurecontainerapps.io//searchwithcriteria"
-        f"?query={query}"
-    )
+    url = f"{SIX_BASE_URL}/searchwithcriteria?query={query}"
     logging.info("Request SIX API for search with criteria with query: %s", query)
-    async with httpx.AsyncClient() as client:
-        response = await client.post(url)
-        response_json = response.json()
+    response = await six_call("SEARCHWITHCRITERIA", url)
     logging.info("Response from SIX API for search with criteria: %s", response)
 
     # convert six response to rechart format
-    obj = json.loads(response_json["object"])
-    tabular_data = json.loads(obj["data"][0])
-
-    return tabular_data
+    return decode_search(response.content)
 
 
 async def fetch_asset_allocation(customer_name: str) -> list[dict]:
     """
-    Retrieves the asset allocation for a specified customer from a JSON file.
+    Retrieves the asset allocation for a specified customer from the allocation store.
 
-    This function reads a JSON file containing multiple customers' financial portfolios
-    and extracts the asset allocation for the given customer. The returned data is
-    structured as a list of dictionaries, where each dictionary represents an asset with
-    its corresponding allocation percentage.
+    The store holds the financial portfolios of all customers in memory (see
+    api/allocations.py) and matches the customer name case- and
+    whitespace-insensitively, falling back to the closest name. The returned data
+    is structured as a list of dictionaries, where each dictionary represents an
+    asset with its corresponding allocation percentage.
 
     Args:
         customer_name (str): The name of the customer whose asset allocation is to be retrieved.
@@ -182,10 +199,10 @@ async def fetch_asset_allocation(customer_name: str) -> list[dict]:
         list[dict]: A list of dictionaries, each containing:
             - "asset" (str): The name of the asset.
             - "allocation" (float): The percentage allocation of the asset.
-    """
-    with open("res/asset_allocation.json", "r") as file:
-        data = json.load(file)
 
-    customer_data = data[customer_name]
+    Raises:
+        KeyError: If no customer matches the name.
+    """
+    customer_data = allocation_store.get(customer_name)
     logging.info("Fetch asses allocation for customer: %s", customer_name)
     return customer_data
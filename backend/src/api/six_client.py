@@ -0,0 +1,148 @@
+"""
+Shared, pooled HTTP client for the SIX API.
+
+All SIX tools send their requests through one long-lived httpx.AsyncClient,
+so connections (TCP + TLS handshake) to the container app are reused across
+tiles and sessions instead of being re-established for every call. The client
+is opened and closed by the FastAPI lifespan hook in main.py.
+
+Configuration (environment variables):
+    SIX_BASE_URL                    Base URL of the SIX API.
+    SIX_HTTP2                       "1" to negotiate HTTP/2 (needs the `h2` package).
+    SIX_MAX_CONNECTIONS             Maximum number of open connections (default 50).
+    SIX_MAX_KEEPALIVE_CONNECTIONS   Maximum number of idle connections kept
+                                    (default 20).
+    SIX_KEEPALIVE_EXPIRY            Seconds an idle connection is kept alive
+                                    (default 60).
+    SIX_TIMEOUT                     Read/write/pool timeout in seconds (default 30).
+    SIX_CONNECT_TIMEOUT             Connect timeout in seconds (default 5).
+
+Example Usage:
+
+from api.six_client import six_post
+
+url = f"{SIX_BASE_URL}/ohlcv?query=NVIDIA&first=01.01.2020&last=01.01.2021"
+response = await six_post(url)
+"""
+
+import importlib.util
+import logging
+import os
+
+import httpx
+
+from cassette import wrap_six_transport
+
+SIX_BASE_URL = os.getenv(
+    "SIX_BASE_URL",
+    "https://idchat-api-containerapp01-dev.orangepebble-16234c4b."
+    "switzerlandnorth.azurecontainerapps.io/",
+)
+
+_client: httpx.AsyncClient | None = None
+
+# Counters exposed through pool_stats()
+_stats = {
+    "requests_total": 0,
+    "errors_total": 0,
+    "in_flight": 0,
+    "connections_opened_total": 0,
+}
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, default))
+
+
+def _create_client() -> httpx.AsyncClient:
+    http2 = os.getenv("SIX_HTTP2", "0") == "1"
+    if http2 and importlib.util.find_spec("h2") is None:
+        logging.warning(
+            "SIX_HTTP2 is set but the 'h2' package is missing, using HTTP/1.1"
+        )
+        http2 = False
+
+    limits = httpx.Limits(
+        max_connections=_env_int("SIX_MAX_CONNECTIONS", 50),
+        max_keepalive_connections=_env_int("SIX_MAX_KEEPALIVE_CONNECTIONS", 20),
+        keepalive_expiry=_env_float("SIX_KEEPALIVE_EXPIRY", 60.0),
+    )
+    timeout = httpx.Timeout(
+        _env_float("SIX_TIMEOUT", 30.0),
+        connect=_env_float("SIX_CONNECT_TIMEOUT", 5.0),
+    )
+    logging.info("Opening SIX HTTP client (http2=%s, limits=%s)", http2, limits)
+    transport = httpx.AsyncHTTPTransport(http2=http2, limits=limits)
+    # Records the exchanges to or replays them from the cassette, if enabled
+    return httpx.AsyncClient(transport=wrap_six_transport(transport), timeout=timeout)
+
+
+async def open_six_client() -> httpx.AsyncClient:
+    """Create the shared client. Called once from the application lifespan."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _create_client()
+    return _client
+
+
+async def close_six_client():
+    """Close the shared client and all pooled connections."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def get_six_client() -> httpx.AsyncClient:
+    """
+    Return the shared client, opening it lazily when running outside of the
+    FastAPI app (e.g. the generate_canvas CLI).
+    """
+    if _client is None or _client.is_closed:
+        return await open_six_client()
+    return _client
+
+
+async def _trace(event_name: str, info: dict):
+    # httpcore reports every new TCP connection, which is what pooling saves us.
+    if event_name == "connection.connect_tcp.complete":
+        _stats["connections_opened_total"] += 1
+
+
+async def six_post(url: str, **kwargs) -> httpx.Response:
+    """
+    Send a POST request to the SIX API over the shared connection pool.
+
+    Raises:
+        httpx.HTTPStatusError: If SIX answers with an error status (e.g. 429).
+    """
+    client = await get_six_client()
+    _stats["requests_total"] += 1
+    _stats["in_flight"] += 1
+    try:
+        response = await client.post(url, extensions={"trace": _trace}, **kwargs)
+        return response.raise_for_status()
+    except httpx.HTTPError:
+        _stats["errors_total"] += 1
+        raise
+    finally:
+        _stats["in_flight"] -= 1
+
+
+def pool_stats() -> dict:
+    """Return request counters and the current state of the connection pool."""
+    stats = dict(_stats)
+    connections = []
+    if _client is not None and not _client.is_closed:
+        # Unwrap the recording transport of a cassette
+        transport = getattr(_client._transport, "transport", _client._transport)
+        pool = getattr(transport, "_pool", None)
+        connections = list(getattr(pool, "connections", []))
+    stats["connections_open"] = len(connections)
+    stats["connections_idle"] = sum(1 for c in connections if c.is_idle())
+    stats["connections_active"] = stats["connections_open"] - stats["connections_idle"]
+    return stats
@@ -0,0 +1,51 @@
+"""
+Decoder for the nested SIX response envelope.
+
+The SIX API wraps its payload in JSON strings inside JSON:
+
+    {"object": "{\"data\": \"{\\\"<id>\\\": \\\"{<time series>}\\\"}\"}"}
+
+Every layer has to be parsed on its own. This module decodes straight from the
+raw response bytes (no intermediate text decode as with `response.json()`) and
+uses orjson when it is installed, falling back to the standard json module.
+
+Example Usage:
+
+from api.six_decode import decode_ohlcv, decode_search
+
+time_series_raw = decode_ohlcv(response.content)
+tabular_data = decode_search(response.content)
+"""
+
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # optional fast backend
+    orjson = None
+
+loads = orjson.loads if orjson is not None else json.loads
+JSON_BACKEND = "orjson" if orjson is not None else "json"
+
+
+def decode_envelope(content: bytes | str) -> Any:
+    """Return the decoded `data` member of a SIX response."""
+    data = loads(loads(content)["object"])["data"]
+    return loads(data) if isinstance(data, str) else data
+
+
+def decode_ohlcv(content: bytes | str) -> dict[str, dict]:
+    """
+    Return the OHLCV time series of a SIX /ohlcv response as
+    {timestamp: {"open", "high", "low", "close", "vol"}}, or {} if there is no data.
+    """
+    data = decode_envelope(content)
+    if not data:
+        return {}
+    return loads(next(iter(data.values())))
+
+
+def decode_search(content: bytes | str) -> dict:
+    """Return the result table of a SIX /searchwithcriteria response."""
+    return loads(decode_envelope(content)[0])
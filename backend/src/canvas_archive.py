@@ -0,0 +1,419 @@
+"""
+Compressed archive of the generated canvases.
+
+`save` only puts the canvas on a queue, the request path never waits on disk.
+A background writer thread serializes the tiles to compact JSON, compresses
+them with zlib and inserts them in batches into a SQLite file (WAL mode), which
+is indexed by session id, creation time and prompt (case-insensitive, so a
+prompt filter is a prefix match on the index). Reads open a read-only
+connection and skip the schema setup of the writer.
+
+Every tile also gets a row in `canvas_tiles` (position, title, type and the
+symbol of its tool call), so canvases can be listed and filtered from the
+indexes without decompressing their tile data. `list_canvases` returns these
+summaries, `get_canvas` loads the data of a single canvas.
+
+Retention: canvases older than CANVAS_ARCHIVE_RETENTION_DAYS and the oldest
+beyond CANVAS_ARCHIVE_MAX_CANVASES are deleted by the writer every
+CANVAS_ARCHIVE_COMPACT_INTERVAL seconds, and the freed pages are returned to the
+file system (incremental vacuum).
+
+Configuration (environment variables):
+    CANVAS_ARCHIVE_DB                 SQLite file
+                                      (default src/canvas/canvas_archive.sqlite3).
+    CANVAS_ARCHIVE_BATCH_SIZE         Maximum canvases per write transaction
+                                      (default 64).
+    CANVAS_ARCHIVE_FLUSH_INTERVAL     Seconds the writer waits to fill a batch
+                                      (default 0.5).
+    CANVAS_ARCHIVE_RETENTION_DAYS     Days a canvas is kept, 0 keeps them forever
+                                      (default 30).
+    CANVAS_ARCHIVE_MAX_CANVASES       Maximum number of canvases kept, 0 for no limit
+                                      (default 100000).
+    CANVAS_ARCHIVE_COMPACT_INTERVAL   Seconds between two retention runs (default 3600).
+
+Example Usage:
+
+from canvas_archive import canvas_archive
+
+canvas_archive.save(data_tiles, session_id="abc", prompt="Show me NVIDIA")
+canvas_archive.list_canvases(tile_type="CANDLE", symbol="nvidia", limit=20)
+canvas_archive.get_canvas(42)
+canvas_archive.close()  # flushes the queue
+
+Canvases written as JSON files by earlier versions are imported with
+
+cd backend/src
+python canvas_archive.py canvas/canvas_*.json
+"""
+
+import json
+import logging
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from datetime import datetime
+from typing import Any
+from urllib.request import pathname2url
+
+backend_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS canvases (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT,
+    prompt TEXT,
+    created_at REAL NOT NULL,
+    tile_count INTEGER NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS canvases_session ON canvases (session_id, created_at);
+CREATE INDEX IF NOT EXISTS canvases_created_at ON canvases (created_at);
+DROP INDEX IF EXISTS canvases_prompt;
+CREATE INDEX IF NOT EXISTS canvases_prompt_nocase ON canvases (prompt COLLATE NOCASE);
+CREATE TABLE IF NOT EXISTS canvas_tiles (
+    canvas_id INTEGER NOT NULL REFERENCES canvases (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    title TEXT,
+    type TEXT,
+    symbol TEXT,
+    PRIMARY KEY (canvas_id, position)
+);
+CREATE INDEX IF NOT EXISTS canvas_tiles_type ON canvas_tiles (type, canvas_id);
+CREATE INDEX IF NOT EXISTS canvas_tiles_symbol ON canvas_tiles (symbol, canvas_id);
+"""
+
+CANVAS_COLUMNS = ("id", "session_id", "prompt", "created_at", "tile_count")
+TILE_COLUMNS = ("position", "title", "type", "symbol")
+
+# Puts the writer thread to rest
+_STOP = object()
+
+
+def normalize_symbol(symbol: str) -> str:
+    return " ".join(symbol.split()).casefold()
+
+
+def tile_symbol(tile: Any) -> str | None:
+    """Return the normalized `symbol` input of the tile's tool call, if any."""
+    tool = getattr(tile, "tool", None)
+    for item in getattr(tool, "inputs", None) or []:
+        key, _, value = item.partition("=")
+        if key.strip() == "symbol" and value.strip():
+            return normalize_symbol(value)
+    return None
+
+
+def compress_tiles(tiles: list[dict]) -> bytes:
+    return zlib.compress(
+        json.dumps(tiles, ensure_ascii=False, separators=(",", ":")).encode()
+    )
+
+
+def decompress_tiles(data: bytes) -> list[dict]:
+    return json.loads(zlib.decompress(data))
+
+
+def _dump(tile: Any) -> dict:
+    return tile.model_dump(mode="json") if hasattr(tile, "model_dump") else tile
+
+
+class CanvasArchive:
+    def __init__(
+        self,
+        db_path: str,
+        batch_size: int = 64,
+        flush_interval: float = 0.5,
+        retention_days: float = 30,
+        max_canvases: int = 100_000,
+        compact_interval: float = 3600,
+    ):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retention_days = retention_days
+        self.max_canvases = max_canvases
+        self.compact_interval = compact_interval
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.compacted = 0
+
+    def connect(self) -> sqlite3.Connection:
+        """Open a connection to the archive, creating the schema if needed."""
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        db = sqlite3.connect(self.db_path, timeout=10.0)
+        # Must be set before the first table is created to take effect
+        db.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute("PRAGMA foreign_keys=ON")
+        db.executescript(SCHEMA)
+        return db
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="canvas-archive-writer", daemon=True
+                )
+                self._thread.start()
+
+    def save(
+        self,
+        tiles: list,
+        session_id: str | None = None,
+        prompt: str | None = None,
+        created_at: float | None = None,
+    ):
+        """Queue a canvas for writing, returns immediately."""
+        self.start()
+        self._queue.put((session_id, prompt, created_at or time.time(), list(tiles)))
+
+    def close(self, timeout: float = 10.0):
+        """Write all queued canvases and stop the writer thread."""
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+
+    def _next_batch(self) -> tuple[list, bool]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while batch[-1] is not _STOP and len(batch) < self.batch_size:
+            try:
+                batch.append(
+                    self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                )
+            except queue.Empty:
+                break
+        stop = batch[-1] is _STOP
+        return [item for item in batch if item is not _STOP], stop
+
+    def _run(self):
+        db = self.connect()
+        last_compaction = 0.0
+        stop = False
+        while not stop:
+            batch, stop = self._next_batch()
+            if batch:
+                self._write(db, batch)
+            if time.monotonic() - last_compaction > self.compact_interval:
+                self.compact(db)
+                last_compaction = time.monotonic()
+        db.close()
+
+    def _write(self, db: sqlite3.Connection, batch: list):
+        rows = []
+        for session_id, prompt, created_at, tiles in batch:
+            try:
+                dumped = [_dump(tile) for tile in tiles]
+                index = [
+                    (
+                        d.get("position", i),
+                        d.get("title"),
+                        d.get("type"),
+                        tile_symbol(tile),
+                    )
+                    for i, (tile, d) in enumerate(zip(tiles, dumped))
+                ]
+                rows.append(
+                    (
+                        (
+                            session_id,
+                            prompt,
+                            created_at,
+                            len(tiles),
+                            compress_tiles(dumped),
+                        ),
+                        index,
+                    )
+                )
+            except (TypeError, ValueError) as e:
+                self.dropped += 1
+                logging.error(
+                    "Could not serialize canvas of session %s: %s", session_id, e
+                )
+        try:
+            with db:
+                for canvas, index in rows:
+                    canvas_id = db.execute(
+                        "INSERT INTO canvases "
+                        "(session_id, prompt, created_at, tile_count, data) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        canvas,
+                    ).lastrowid
+                    db.executemany(
+                        "INSERT OR REPLACE INTO canvas_tiles VALUES (?, ?, ?, ?, ?)",
+                        ((canvas_id, *tile) for tile in index),
+                    )
+        except sqlite3.Error as e:
+            self.dropped += len(rows)
+            logging.error(
+                "Could not write %d canvases to the archive: %s", len(rows), e
+            )
+            return
+        self.written += len(rows)
+        self.batches += 1
+        logging.info("Canvas archive: wrote %d canvases to %s", len(rows), self.db_path)
+
+    def compact(self, db: sqlite3.Connection):
+        """Apply the retention limits and release the freed pages."""
+        try:
+            with db:
+                removed = 0
+                if self.retention_days > 0:
+                    cutoff = time.time() - self.retention_days * 86400
+                    removed += db.execute(
+                        "DELETE FROM canvases WHERE created_at < ?", (cutoff,)
+                    ).rowcount
+                if self.max_canvases > 0:
+                    removed += db.execute(
+                        "DELETE FROM canvases WHERE id <= "
+                        "(SELECT id FROM canvases ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                        (self.max_canvases,),
+                    ).rowcount
+            if removed:
+                db.execute("PRAGMA incremental_vacuum")
+                self.compacted += removed
+                logging.info("Canvas archive: removed %d canvases", removed)
+        except sqlite3.Error as e:
+            logging.error("Canvas archive compaction failed: %s", e)
+
+    def _read(self) -> sqlite3.Connection | None:
+        """Open a read-only connection, None if nothing was archived yet."""
+        # Readers use their own short-lived connection, WAL runs them next to the writer
+        if not os.path.exists(self.db_path):
+            return None
+        uri = f"file:{pathname2url(os.path.abspath(self.db_path))}?mode=ro"
+        return sqlite3.connect(uri, uri=True, timeout=10.0)
+
+    def list_canvases(
+        self,
+        session_id: str | None = None,
+        since: float | None = None,
+        until: float | None = None,
+        tile_type: str | None = None,
+        symbol: str | None = None,
+        prompt: str | None = None,
+        before_id: int | None = None,
+        limit: int = 50,
+    ) -> list[dict]:
+        """
+        Return the newest canvases matching all given filters, without their tile
+        data. `prompt` matches the prompts starting with it, ignoring case. Pass
+        the smallest returned id as `before_id` to get the next page.
+        """
+        where, params = [], []
+        if session_id is not None:
+            where.append("session_id = ?")
+            params.append(session_id)
+        if since is not None:
+            where.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("created_at <= ?")
+            params.append(until)
+        if tile_type is not None:
+            where.append("id IN (SELECT canvas_id FROM canvas_tiles WHERE type = ?)")
+            params.append(tile_type.upper())
+        if symbol is not None:
+            where.append("id IN (SELECT canvas_id FROM canvas_tiles WHERE symbol = ?)")
+            params.append(normalize_symbol(symbol))
+        if prompt is not None:
+            # A range on the NOCASE index, unlike LIKE '%...%' it needs no table scan
+            where.append("prompt >= ? COLLATE NOCASE AND prompt < ? COLLATE NOCASE")
+            params.extend((prompt, prompt + "\U0010ffff"))
+        if before_id is not None:
+            where.append("id < ?")
+            params.append(before_id)
+
+        db = self._read()
+        if db is None:
+            return []
+        try:
+            rows = db.execute(
+                f"SELECT {', '.join(CANVAS_COLUMNS)} FROM canvases "
+                f"{'WHERE ' + ' AND '.join(where) if where else ''} "
+                "ORDER BY id DESC LIMIT ?",
+                (*params, limit),
+            ).fetchall()
+            canvases = {
+                row[0]: dict(zip(CANVAS_COLUMNS, row), tiles=[]) for row in rows
+            }
+            if canvases:
+                tiles = db.execute(
+                    f"SELECT canvas_id, {', '.join(TILE_COLUMNS)} FROM canvas_tiles "
+                    f"WHERE canvas_id IN ({', '.join('?' * len(canvases))}) "
+                    "ORDER BY canvas_id, position",
+                    tuple(canvases),
+                )
+                for canvas_id, *tile in tiles:
+                    canvases[canvas_id]["tiles"].append(dict(zip(TILE_COLUMNS, tile)))
+        finally:
+            db.close()
+        return list(canvases.values())
+
+    def get_canvas(self, canvas_id: int) -> dict | None:
+        """Return a canvas with its tile data, or None if it does not exist."""
+        db = self._read()
+        if db is None:
+            return None
+        try:
+            row = db.execute(
+                f"SELECT {', '.join(CANVAS_COLUMNS)}, data FROM canvases WHERE id = ?",
+                (canvas_id,),
+            ).fetchone()
+        finally:
+            db.close()
+        if row is None:
+            return None
+        return dict(zip(CANVAS_COLUMNS, row[:-1]), tiles=decompress_tiles(row[-1]))
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "compacted": self.compacted,
+        }
+
+
+canvas_archive = CanvasArchive(
+    db_path=os.getenv(
+        "CANVAS_ARCHIVE_DB",
+        os.path.join(backend_path, "src", "canvas", "canvas_archive.sqlite3"),
+    ),
+    batch_size=int(os.getenv("CANVAS_ARCHIVE_BATCH_SIZE", 64)),
+    flush_interval=float(os.getenv("CANVAS_ARCHIVE_FLUSH_INTERVAL", 0.5)),
+    retention_days=float(os.getenv("CANVAS_ARCHIVE_RETENTION_DAYS", 30)),
+    max_canvases=int(os.getenv("CANVAS_ARCHIVE_MAX_CANVASES", 100_000)),
+    compact_interval=float(os.getenv("CANVAS_ARCHIVE_COMPACT_INTERVAL", 3600)),
+)
+
+
+def import_files(paths: list[str]):
+    """Import canvases saved as canvas_<YYYYmmdd_HHMMSS>.json files."""
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as file:
+            tiles = json.load(file)
+        stamp = os.path.splitext(os.path.basename(path))[0].removeprefix("canvas_")
+        try:
+            created_at = datetime.strptime(stamp, "%Y%m%d_%H%M%S").timestamp()
+        except ValueError:
+            created_at = os.path.getmtime(path)
+        canvas_archive.save(tiles, created_at=created_at)
+    canvas_archive.close()
+    logging.info("Imported %d canvas files", len(paths))
+
+
+if __name__ == "__main__":
+    import_files(sys.argv[1:])
@@ -0,0 +1,401 @@
+"""
+Record and replay of SIX and LLM traffic.
+
+In record mode every SIX HTTP exchange (sent through the shared client of
+api/six_client.py) and every BAML call of generate_canvas is written to a
+cassette, a gzip-compressed JSON Lines file with one entry per exchange and its
+latency. In replay mode the same calls are answered from the cassette after the
+recorded latency times CASSETTE_LATENCY_SCALE, without network access. A
+recorded prompt mix can so be replayed deterministically against different
+pipeline variants, and a slow canvas can be reproduced without LLM tokens.
+
+SIX exchanges are keyed by method, path and query. LLM calls are keyed by the BAML
+function and the HTTP request BAML renders for it (b.request, see
+baml_client/async_request.py), so a changed prompt never replays stale answers.
+The raw LLM text is stored and parsed with b.parse on replay (b.parse_stream
+for the partial plans of a streamed call). Identical requests are answered in
+recorded order, the last answer repeats. While replaying, generate_canvas takes
+the day of the recording as today, so tool calls and SIX URLs match.
+
+Configuration (environment variables):
+    CASSETTE_MODE             "record" or "replay" (default off).
+    CASSETTE_PATH             Cassette file (default cassettes/canvas.jsonl.gz in the
+                              backend). Recording appends to an existing file.
+    CASSETTE_LATENCY_SCALE    Factor for the recorded latencies on replay (default 1,
+                              0 for none).
+
+Example Usage:
+
+cd backend
+CASSETTE_MODE=record CASSETTE_PATH=cassettes/prod_mix.jsonl.gz uvicorn main:app
+CASSETTE_MODE=replay CASSETTE_PATH=cassettes/prod_mix.jsonl.gz \\
+    CASSETTE_LATENCY_SCALE=0.5 uvicorn main:app
+"""
+
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+import time
+from datetime import date
+from typing import Any
+
+import httpx
+from baml_py import Collector
+
+from baml_client.async_client import b
+
+backend_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+DEFAULT_PATH = os.path.join(backend_path, "cassettes", "canvas.jsonl.gz")
+
+CASSETTE_MODES = ("record", "replay")
+
+# Partial results emitted while replaying a streamed call
+STREAM_STEPS = 10
+
+
+class CassetteMissError(LookupError):
+    pass
+
+
+class Cassette:
+    def __init__(self, path: str, mode: str, latency_scale: float = 1.0):
+        if mode not in CASSETTE_MODES:
+            raise ValueError(
+                f"Unknown cassette mode '{mode}', expected one of {CASSETTE_MODES}"
+            )
+        self.path = path
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self.recorded_at = date.today()
+        self._entries: dict[str, list[dict]] = {}
+        self._replayed: dict[str, int] = {}
+        self._file = None
+        self.recorded = 0
+        self.replayed = 0
+        self.misses = 0
+        if mode == "replay":
+            self._load()
+
+    def _load(self):
+        header = None
+        with gzip.open(self.path, "rt", encoding="utf-8") as file:
+            for line in file:
+                entry = json.loads(line)
+                if "cassette" in entry:
+                    header = header or entry
+                    continue
+                self._entries.setdefault(entry["key"], []).append(entry)
+        if header is not None:
+            self.recorded_at = date.fromisoformat(header["recorded_at"])
+        logging.info(
+            "Replaying %d recorded requests from %s (recorded on %s)",
+            sum(len(entries) for entries in self._entries.values()),
+            self.path,
+            self.recorded_at,
+        )
+
+    def record(self, kind: str, key: str, latency: float, **response: Any):
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            new = not os.path.exists(self.path)
+            self._file = gzip.open(self.path, "at", encoding="utf-8")
+            if new:
+                header = {"cassette": 1, "recorded_at": self.recorded_at.isoformat()}
+                self._file.write(json.dumps(header) + "\n")
+        entry = {"kind": kind, "key": key, "latency": round(latency, 4), **response}
+        self._file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        self.recorded += 1
+
+    def replay(self, key: str) -> dict:
+        """
+        Return the next recorded answer for `key`.
+
+        Raises:
+            CassetteMissError: If the request was never recorded.
+        """
+        entries = self._entries.get(key)
+        if not entries:
+            self.misses += 1
+            raise CassetteMissError(f"No recording for '{key}' in {self.path}")
+        index = self._replayed.get(key, 0)
+        self._replayed[key] = index + 1
+        self.replayed += 1
+        return entries[min(index, len(entries) - 1)]
+
+    async def wait(self, entry: dict, fraction: float = 1.0):
+        await asyncio.sleep(entry["latency"] * self.latency_scale * fraction)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "path": self.path,
+            "recorded": self.recorded,
+            "replayed": self.replayed,
+            "misses": self.misses,
+        }
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def six_key(request: httpx.Request) -> str:
+    # Without the host, so a recording replays whatever SIX_BASE_URL points to
+    return f"{request.method} {request.url.raw_path.decode()}"
+
+
+def _response(status_code: int, content_type: str | None, body: str) -> httpx.Response:
+    # The body is stored decoded, so no Content-Encoding or Content-Length is passed on
+    headers = {"content-type": content_type} if content_type else {}
+    return httpx.Response(status_code, headers=headers, content=body.encode())
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    def __init__(self, transport: httpx.AsyncBaseTransport, cassette: Cassette):
+        self.transport = transport
+        self.cassette = cassette
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started_at = time.perf_counter()
+        response = await self.transport.handle_async_request(request)
+        try:
+            content = await response.aread()
+        finally:
+            await response.aclose()
+        body = content.decode("utf-8", "replace")
+        content_type = response.headers.get("content-type")
+        self.cassette.record(
+            "six",
+            six_key(request),
+            time.perf_counter() - started_at,
+            status=response.status_code,
+            content_type=content_type,
+            body=body,
+        )
+        return _response(response.status_code, content_type, body)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    def __init__(self, cassette: Cassette):
+        self.cassette = cassette
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        entry = self.cassette.replay(six_key(request))
+        await self.cassette.wait(entry)
+        return _response(entry["status"], entry["content_type"], entry["body"])
+
+
+async def llm_key(function_name: str, args: tuple, kwargs: dict) -> str:
+    """Key of a BAML call: the function and a hash of the HTTP request BAML renders."""
+    request = await getattr(b.request, function_name)(*args, **kwargs)
+    body = json.dumps(request.body.json(), sort_keys=True)
+    return f"llm {function_name} {hashlib.sha256(body.encode()).hexdigest()[:32]}"
+
+
+def _with_collector(baml_options: dict | None, collector: Collector) -> dict:
+    options = dict(baml_options or {})
+    collectors = options.get("collector") or []
+    if not isinstance(collectors, list):
+        collectors = [collectors]
+    options["collector"] = [*collectors, collector]
+    return options
+
+
+def _record_llm(cassette: Cassette, key: str, collector: Collector, latency: float):
+    log = collector.last
+    if log is None or log.raw_llm_response is None:
+        logging.warning("No raw LLM response to record for %s", key)
+        return
+    cassette.record("llm", key, latency, text=log.raw_llm_response)
+
+
+class _RecordingStream:
+    def __init__(
+        self,
+        stream,
+        cassette: Cassette,
+        collector: Collector,
+        function_name: str,
+        args,
+        kwargs,
+    ):
+        self._stream = stream
+        self._cassette = cassette
+        self._collector = collector
+        self._call = (function_name, args, kwargs)
+        self._started_at = time.perf_counter()
+
+    async def __aiter__(self):
+        async for partial in self._stream:
+            yield partial
+
+    async def get_final_response(self):
+        result = await self._stream.get_final_response()
+        latency = time.perf_counter() - self._started_at
+        _record_llm(
+            self._cassette, await llm_key(*self._call), self._collector, latency
+        )
+        return result
+
+
+class _ReplayStream:
+    def __init__(self, cassette: Cassette, function_name: str, args, kwargs):
+        self._cassette = cassette
+        self._call = (function_name, args, kwargs)
+        self._entry: dict | None = None
+        self._waited = False
+
+    async def _next_entry(self) -> dict:
+        if self._entry is None:
+            self._entry = self._cassette.replay(await llm_key(*self._call))
+        return self._entry
+
+    async def __aiter__(self):
+        entry = await self._next_entry()
+        text = entry["text"]
+        parse = getattr(b.parse_stream, self._call[0])
+        for step in range(1, STREAM_STEPS + 1):
+            await self._cassette.wait(entry, 1 / STREAM_STEPS)
+            try:
+                yield parse(text[: len(text) * step // STREAM_STEPS])
+            except Exception:
+                # Some prefixes cannot be parsed yet, the next one will
+                continue
+        self._waited = True
+
+    async def get_final_response(self):
+        entry = await self._next_entry()
+        if not self._waited:
+            await self._cassette.wait(entry)
+        return getattr(b.parse, self._call[0])(entry["text"])
+
+
+class _RecordingStreamClient:
+    def __init__(self, stream_client, cassette: Cassette):
+        self._stream_client = stream_client
+        self._cassette = cassette
+
+    def __getattr__(self, function_name: str):
+        function = getattr(self._stream_client, function_name)
+
+        def call(*args, baml_options: dict | None = None, **kwargs):
+            collector = Collector(name=f"cassette.{function_name}")
+            stream = function(
+                *args, baml_options=_with_collector(baml_options, collector), **kwargs
+            )
+            return _RecordingStream(
+                stream, self._cassette, collector, function_name, args, kwargs
+            )
+
+        return call
+
+
+class _ReplayStreamClient:
+    def __init__(self, cassette: Cassette):
+        self._cassette = cassette
+
+    def __getattr__(self, function_name: str):
+        def call(*args, baml_options: dict | None = None, **kwargs):
+            return _ReplayStream(self._cassette, function_name, args, kwargs)
+
+        return call
+
+
+class RecordingBamlClient:
+    """Wraps the async BAML client and records the raw LLM text of every call."""
+
+    def __init__(self, client, cassette: Cassette):
+        self._client = client
+        self._cassette = cassette
+        self.stream = _RecordingStreamClient(client.stream, cassette)
+
+    def __getattr__(self, function_name: str):
+        function = getattr(self._client, function_name)
+
+        async def call(*args, baml_options: dict | None = None, **kwargs):
+            collector = Collector(name=f"cassette.{function_name}")
+            started_at = time.perf_counter()
+            result = await function(
+                *args, baml_options=_with_collector(baml_options, collector), **kwargs
+            )
+            latency = time.perf_counter() - started_at
+            _record_llm(
+                self._cassette,
+                await llm_key(function_name, args, kwargs),
+                collector,
+                latency,
+            )
+            return result
+
+        return call
+
+
+class ReplayBamlClient:
+    """Answers BAML calls from the cassette, parsing the recorded LLM text."""
+
+    def __init__(self, cassette: Cassette):
+        self._cassette = cassette
+        self.stream = _ReplayStreamClient(cassette)
+
+    def __getattr__(self, function_name: str):
+        async def call(*args, baml_options: dict | None = None, **kwargs):
+            entry = self._cassette.replay(await llm_key(function_name, args, kwargs))
+            await self._cassette.wait(entry)
+            return getattr(b.parse, function_name)(entry["text"])
+
+        return call
+
+
+def create_cassette() -> Cassette | None:
+    mode = os.getenv("CASSETTE_MODE", "")
+    if not mode:
+        return None
+    return Cassette(
+        os.getenv("CASSETTE_PATH", DEFAULT_PATH),
+        mode,
+        float(os.getenv("CASSETTE_LATENCY_SCALE", 1)),
+    )
+
+
+cassette = create_cassette()
+
+
+def wrap_baml_client(client):
+    """Return the client that records to or replays from the cassette, if enabled."""
+    if cassette is None:
+        return client
+    if cassette.mode == "record":
+        return RecordingBamlClient(client, cassette)
+    return ReplayBamlClient(cassette)
+
+
+def wrap_six_transport(transport: httpx.AsyncBaseTransport) -> httpx.AsyncBaseTransport:
+    if cassette is None:
+        return transport
+    if cassette.mode == "record":
+        return RecordingTransport(transport, cassette)
+    return ReplayTransport(cassette)
+
+
+def today() -> date:
+    """The day of the recording while replaying, otherwise today."""
+    if cassette is not None and cassette.mode == "replay":
+        return cassette.recorded_at
+    return date.today()
+
+
+def cassette_stats() -> dict[str, Any] | None:
+    return cassette.stats() if cassette is not None else None
+
+
+def close_cassette():
+    if cassette is not None:
+        cassette.close()
@@ -2,25 +2,38 @@
 import sys
 import os
 import dotenv
-from datetime import datetime, timedelta
+from datetime import timedelta
+from pydantic import Field
+from typing import AsyncIterator
 import logging
-import json
 import asyncio
 
-
 backend_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 sys.path.append(backend_path)
 
-import baml_client as client
-
-from baml_client.async_client import b as b_async  # TODO use async_client
+from baml_client.async_client import b as b_async
 from baml_client import reset_baml_env_vars
-from baml_client.types import Tile, ToolType
+from baml_client.types import Canvas, Tile, Tool, ToolCanvas, ToolType
 
-from api.six import call_ohlcv, call_searchwithcriteria, fetch_asset_allocation
+from api.six import (
+    call_searchwithcriteria,
+    fetch_asset_allocation,
+    fetch_ohlcv_series,
+    ohlcv_payload,
+)
+from api.columnar import OhlcvColumns
+from api.downsample import downsample
+from api.limiter import upstream_limiters
+from api.resilience import canvas_deadline_scope, remaining_budget
+from llm_cache import LLMCache, normalize_prompt, normalize_text
+from canvas_archive import canvas_archive
+from single_flight import SingleFlight
+from metrics import llm_span, span
+from cassette import close_cassette, today, wrap_baml_client
 
 TOOLS = {
-    ToolType.OHLCV: call_ohlcv,
+    # Full resolution, build_tile downsamples the series for the tile
+    ToolType.OHLCV: fetch_ohlcv_series,
     ToolType.SEARCHWITHCRITERIA: call_searchwithcriteria,
     ToolType.FETCH_ASSET_ALLOCATION: fetch_asset_allocation,
 }
@@ -45,70 +58,314 @@ dotenv.load_dotenv()
 
 reset_baml_env_vars(dict(os.environ))
 
+# Records the LLM calls to or replays them from the cassette, if enabled (cassette.py)
+b_async = wrap_baml_client(b_async)
+
+# Resolved tool calls per tile spec, so repeated tiles skip the LLM round trip.
+# Set TOOL_CALL_CACHE_DB to a file path to keep them across restarts.
+tool_call_cache = LLMCache[Tool](
+    "tool_calls",
+    max_size=int(os.getenv("TOOL_CALL_CACHE_SIZE", 1024)),
+    ttl=float(os.getenv("TOOL_CALL_CACHE_TTL", 3600)),
+    db_path=os.getenv("TOOL_CALL_CACHE_DB"),
+    dumps=lambda tool: tool.model_dump_json(),
+    loads=Tool.model_validate_json,
+)
+
+# Canvas plans per normalized prompt and context. Plans stay valid for relative
+# time phrases ("past four weeks"), dates are only resolved in generate_tool_call.
+canvas_plan_cache = LLMCache[Canvas](
+    "canvas_plans",
+    max_size=int(os.getenv("CANVAS_PLAN_CACHE_SIZE", 256)),
+    ttl=float(os.getenv("CANVAS_PLAN_CACHE_TTL", 3600)),
+    db_path=os.getenv("CANVAS_PLAN_CACHE_DB"),
+    dumps=lambda canvas: canvas.model_dump_json(),
+    loads=Canvas.model_validate_json,
+    normalize=normalize_prompt,
+)
+
+
+# "staged": plan the whole canvas, then resolve tiles.
+# "speculative": stream the plan and resolve each tile as soon as it is complete.
+# "single_shot": plan tiles and their tool calls in one LLM call.
+PIPELINE_MODES = ("staged", "speculative", "single_shot")
+PIPELINE_MODE = os.getenv("CANVAS_PIPELINE_MODE", "staged")
+
+# BAML client of the functions in baml_src, LLM calls are limited per client
+BAML_CLIENT = "CustomGemini2Flash"
+
+# Bars per LINE/CANDLE tile at most, longer series are downsampled (0 keeps every bar)
+TILE_TARGET_POINTS = int(os.getenv("TILE_TARGET_POINTS", 400))
+
+# Identical tool calls running at the same time share one upstream request, every
+# caller waits for it within its own canvas budget
+tool_calls_in_flight = SingleFlight("tool_calls", timeout=remaining_budget)
+
 
 class DataTile(Tile):
-    data: list | dict | str | None
+    data: list | dict | str | OhlcvColumns | None
     position: int
+    # Indexed by the canvas archive (e.g. the symbol), not sent to clients
+    tool: Tool | None = Field(default=None, exclude=True)
 
 
-async def generate_canvas(user_input: str, canvas_context: str = "") -> list[DataTile]:
+async def generate_canvas(
+    user_input: str, canvas_context: str = "", mode: str | None = None
+) -> list[DataTile]:
     logging.info(
         "Generating canvas with user input: %s and context: %s",
         user_input,
         canvas_context,
     )
-    canvas = client.b.GenerateCanvas(user_input, canvas_context)
-    logging.info("Generated canvas: %s", canvas)
+    # Every tile resolves its tool call and fetches its data independently, so a
+    # fast tile never waits for the slowest LLM response before fetching.
+    data_tiles = {}
+    async for item in stream_canvas(user_input, canvas_context, mode):
+        if isinstance(item, DataTile):
+            data_tiles[item.position] = item
+
     canvas_data = []
-    tasks_generate_call = []
-    for tile in canvas.tiles:
-        use_date = tile.type in ["LINE", "CANDLE"]
-        logging.debug("Scheduling tool call for tile: %s", tile)
-        tasks_generate_call.append(
-            generate_tool_call(tile=tile, context="", date=use_date)
-        )
+    for position in sorted(data_tiles):
+        data_tile = data_tiles[position]
+        data_tile.position = len(canvas_data)
+        # could resolve positioning differently later or update
+        canvas_data.append(data_tile)
 
-    # Await all tasks concurrently.
-    tool_calls = await asyncio.gather(*tasks_generate_call)
+    save_canvas(canvas_data, prompt=user_input)
+
+    return canvas_data
 
-    tasks_perform_call = [perform_tool_call(tool_call) for tool_call in tool_calls]
-    tasks_perform_result = await asyncio.gather(
-        *tasks_perform_call, return_exceptions=True
+
+async def stream_canvas(
+    user_input: str, canvas_context: str = "", mode: str | None = None
+) -> AsyncIterator[Canvas | DataTile]:
+    """
+    Yield the canvas plan and every DataTile as soon as its data has arrived,
+    so the first tile is not held back by the slowest one. Tiles keep the
+    position of their plan entry. In speculative mode tiles may arrive before
+    the plan is complete. SIX calls of all tiles share a budget of
+    CANVAS_BUDGET seconds (see api/resilience.py).
+    """
+    logging.info(
+        "Streaming canvas with user input: %s and context: %s",
+        user_input,
+        canvas_context,
     )
+    # Planner and tile tasks report to one queue: the Canvas, a DataTile, the
+    # position of a failed tile or an exception that aborts the canvas.
+    events: asyncio.Queue = asyncio.Queue()
+    tasks: list[asyncio.Task] = []
 
-    for tile, tool_call, data in zip(canvas.tiles, tool_calls, tasks_perform_result):
-        logging.info("Generated tool call: %s", tool_call)
-        if isinstance(data, Exception):
-            logging.error("Error performing tool call for tile %s: %s", tile, data)
-            continue
-        data_tile = DataTile(
-            title=tile.title,
-            type=tile.type,
-            content=tile.content,
-            data=data,
-            position=len(canvas_data),
-            # could resolve positioning differently later or update
+    async def run_tile(tile: Tile, position: int, tool_call: Tool | None):
+        try:
+            events.put_nowait(await build_tile(tile, position, tool_call))
+        except Exception as e:
+            logging.error("Error building tile %s: %s", tile, e)
+            events.put_nowait(position)
+
+    async def run_plan():
+        # The planner task runs in a context of its own, the deadline set here
+        # bounds the SIX calls of this canvas only and is inherited by the tile tasks.
+        with canvas_deadline_scope():
+            try:
+                tiles = []
+                async for position, tile, tool_call in plan_tiles(
+                    user_input, canvas_context, mode
+                ):
+                    tasks.append(
+                        asyncio.create_task(run_tile(tile, position, tool_call))
+                    )
+                    tiles.append(tile)
+                events.put_nowait(Canvas(tiles=tiles))
+            except Exception as e:
+                events.put_nowait(e)
+
+    planner = asyncio.create_task(run_plan())
+    canvas = None
+    finished = 0
+    try:
+        while canvas is None or finished < len(canvas.tiles):
+            event = await events.get()
+            if isinstance(event, Exception):
+                raise event
+            if isinstance(event, Canvas):
+                canvas = event
+                yield canvas
+                continue
+            finished += 1
+            if isinstance(event, DataTile):
+                yield event
+    finally:
+        # The consumer may stop early (e.g. client disconnected)
+        planner.cancel()
+        for task in tasks:
+            task.cancel()
+
+
+async def plan_tiles(
+    user_input: str, canvas_context: str = "", mode: str | None = None
+) -> AsyncIterator[tuple[int, Tile, Tool | None]]:
+    """
+    Yield (position, tile, tool call) for every tile of the canvas plan. The
+    tool call is None if it still has to be generated.
+
+    In "staged" mode the whole plan is generated first. In "speculative" mode
+    the plan is streamed and a tile is yielded as soon as the model has moved
+    on to the next one, so its tool call starts while the rest is planned.
+    In "single_shot" mode one LLM call returns the tiles with their tool calls.
+    """
+    mode = mode or PIPELINE_MODE
+    if mode not in PIPELINE_MODES:
+        raise ValueError(
+            f"Unknown pipeline mode '{mode}', expected one of {PIPELINE_MODES}"
         )
-        canvas_data.append(data_tile)
 
-    save_canvas(canvas_data)
+    canvas = canvas_plan_cache.get((user_input, canvas_context))
+    if canvas is not None:
+        logging.info("Canvas plan cache hit: %s", canvas)
+    elif mode == "speculative":
+        async for position, tile in _stream_plan(user_input, canvas_context):
+            yield position, tile, None
+        return
+    elif mode == "single_shot":
+        async for planned in _plan_single_shot(user_input, canvas_context):
+            yield planned
+        return
+    else:
+        async with upstream_limiters.get(BAML_CLIENT).slot():
+            with llm_span("GenerateCanvas") as baml_options:
+                canvas = await b_async.GenerateCanvas(
+                    user_input, canvas_context, baml_options=baml_options
+                )
+        canvas_plan_cache.set((user_input, canvas_context), canvas)
+        logging.info("Generated canvas: %s", canvas)
+
+    for position, tile in enumerate(canvas.tiles):
+        yield position, tile, None
+
+
+async def _plan_single_shot(
+    user_input: str, canvas_context: str
+) -> AsyncIterator[tuple[int, Tile, Tool]]:
+    async with upstream_limiters.get(BAML_CLIENT).slot():
+        with llm_span("GenerateCanvasWithTools") as baml_options:
+            tool_canvas: ToolCanvas = await b_async.GenerateCanvasWithTools(
+                user_input,
+                canvas_context,
+                _current_date(True),
+                baml_options=baml_options,
+            )
+    canvas = Canvas(
+        tiles=[
+            Tile(title=t.title, type=t.type, content=t.content)
+            for t in tool_canvas.tiles
+        ]
+    )
+    canvas_plan_cache.set((user_input, canvas_context), canvas)
+    logging.info("Generated canvas with tool calls: %s", tool_canvas)
+
+    for position, (tile, tool_tile) in enumerate(zip(canvas.tiles, tool_canvas.tiles)):
+        # Later staged runs of the cached plan find these tool calls in the cache.
+        date = _current_date(_uses_date(tile))
+        tool_call_cache.set(_tool_call_cache_key(tile, "", date), tool_tile.tool)
+        yield position, tile, tool_tile.tool
+
+
+async def _stream_plan(
+    user_input: str, canvas_context: str
+) -> AsyncIterator[tuple[int, Tile]]:
+    started = []
+    async with upstream_limiters.get(BAML_CLIENT).slot():
+        with llm_span("GenerateCanvas") as baml_options:
+            stream = b_async.stream.GenerateCanvas(
+                user_input, canvas_context, baml_options=baml_options
+            )
+            async for partial in stream:
+                # Earlier tiles do not change once the model has started the next one.
+                while len(started) + 1 < len(partial.tiles):
+                    tile = _complete_tile(partial.tiles[len(started)])
+                    if tile is None:
+                        break
+                    logging.info("Speculatively starting tile: %s", tile.title)
+                    started.append(tile)
+                    yield len(started) - 1, tile
+
+            canvas = await stream.get_final_response()
+    canvas_plan_cache.set((user_input, canvas_context), canvas)
+    logging.info("Generated canvas: %s", canvas)
+    for position, tile in enumerate(canvas.tiles):
+        if position < len(started):
+            if tile != started[position]:
+                logging.warning(
+                    "Final plan changed speculative tile %s: %s", position, tile
+                )
+            continue
+        yield position, tile
 
-    return canvas_data
 
+def _complete_tile(partial) -> Tile | None:
+    if partial.title is None or partial.type is None or partial.content is None:
+        return None
+    return Tile(title=partial.title, type=partial.type, content=partial.content)
 
-async def generate_tool_call(tile: Tile, context: str = "", date: bool = False) -> str:
-    if date:
-        current_date = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
-    else:
-        current_date = ""
 
-    tool_call = await b_async.GenerateToolCalls(
+async def build_tile(
+    tile: Tile, position: int, tool_call: Tool | None = None
+) -> DataTile:
+    """Resolve the tool call of a single tile (unless given) and fetch its data."""
+    if tool_call is None:
+        tool_call = await generate_tool_call(
+            tile=tile, context="", date=_uses_date(tile)
+        )
+    logging.info("Generated tool call: %s", tool_call)
+    data = await perform_tool_call(tool_call)
+    if isinstance(data, OhlcvColumns):
+        # The series may be shared with other tiles and the cache, downsample copies it
+        data = ohlcv_payload(downsample(data, tile.type.value, TILE_TARGET_POINTS))
+    return DataTile(
         title=tile.title,
-        type=tile.type.value,
-        description=tile.content,
-        context=context,
-        date=current_date,
+        type=tile.type,
+        content=tile.content,
+        data=data,
+        position=position,
+        tool=tool_call,
     )
+
+
+def _uses_date(tile: Tile) -> bool:
+    return tile.type in ["LINE", "CANDLE"]
+
+
+def _current_date(date: bool) -> str:
+    if date:
+        return (today() - timedelta(days=1)).strftime("%Y-%m-%d")
+    return ""
+
+
+def _tool_call_cache_key(tile: Tile, context: str, current_date: str) -> tuple:
+    return (tile.title, tile.type.value, tile.content, context, current_date)
+
+
+async def generate_tool_call(tile: Tile, context: str = "", date: bool = False) -> str:
+    current_date = _current_date(date)
+
+    cache_key = _tool_call_cache_key(tile, context, current_date)
+    tool_call = tool_call_cache.get(cache_key)
+    if tool_call is not None:
+        logging.info("Tool call cache hit for tile: %s", tile.title)
+        return tool_call
+
+    async with upstream_limiters.get(BAML_CLIENT).slot():
+        with llm_span("GenerateToolCalls") as baml_options:
+            tool_call = await b_async.GenerateToolCalls(
+                title=tile.title,
+                type=tile.type.value,
+                description=tile.content,
+                context=context,
+                date=current_date,
+                baml_options=baml_options,
+            )
+    tool_call_cache.set(cache_key, tool_call)
     return tool_call
 
 
@@ -130,9 +387,16 @@ async def perform_tool_call(tool_call) -> str:
                 f"Unable to parse input '{item}'. Expected format key=value. ({e})"
             )
 
-    # Execute the tool function with the provided inputs.
+    # Execute the tool with the provided inputs, or join the same call in flight
+    key = (
+        tool_call.type,
+        tuple(sorted((k.strip(), normalize_text(v)) for k, v in inputs_dict.items())),
+    )
     try:
-        response = await function(**inputs_dict)
+        with span(f"tool.{tool_call.type.value}"):
+            response = await tool_calls_in_flight.do(
+                key, lambda: function(**inputs_dict)
+            )
     except Exception as e:
         raise Exception(
             f"Error executing tool '{tool_call.type}' with inputs {inputs_dict}: {e}"
@@ -141,21 +405,11 @@ async def perform_tool_call(tool_call) -> str:
     return response
 
 
-def save_canvas(canvas_data):
-    canvas_folder = os.path.join(backend_path, "src/canvas")
-    os.makedirs(canvas_folder, exist_ok=True)
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    file_path = os.path.join(canvas_folder, f"canvas_{timestamp}.json")
-
-    with open(file_path, "w", encoding="utf-8") as file:
-        json.dump(
-            [data_tile.__dict__ for data_tile in canvas_data],
-            file,
-            ensure_ascii=False,
-            indent=4,
-        )
-
-    logging.info("Canvas data written to file: %s", file_path)
+def save_canvas(canvas_data, session_id: str | None = None, prompt: str | None = None):
+    """Queue the canvas for the archive, the write happens in the background."""
+    with span("save_canvas"):
+        canvas_archive.save(canvas_data, session_id=session_id, prompt=prompt)
+    logging.info("Canvas with %d tiles queued for the archive", len(canvas_data))
 
 
 def main():
@@ -163,6 +417,8 @@ def main():
     user_input = input("Enter user input: ")
     context = input("Enter context (optional): ")
     canvas = asyncio.run(generate_canvas(user_input, context))
+    canvas_archive.close()
+    close_cassette()
 
 
 if __name__ == "__main__":
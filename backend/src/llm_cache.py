@@ -0,0 +1,155 @@
+"""
+Memoizing cache for LLM results.
+
+Keys are tuples of strings that are normalized (case- and whitespace-insensitive)
+before lookup, so trivially different inputs share an entry. Entries are evicted
+least-recently-used once `max_size` is reached and expire after `ttl` seconds.
+Optionally the cache is written through to a local SQLite file and survives
+restarts.
+
+Example Usage:
+
+from llm_cache import LLMCache
+
+cache = LLMCache("tool_calls", max_size=1024, ttl=3600, db_path="cache.sqlite3",
+                 dumps=lambda tool: tool.model_dump_json(),
+                 loads=Tool.model_validate_json)
+tool = cache.get((title, type, description))
+if tool is None:
+    tool = await b_async.GenerateToolCalls(...)
+    cache.set((title, type, description), tool)
+"""
+
+import logging
+import re
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Generic, Iterable, TypeVar
+
+T = TypeVar("T")
+
+# Separates the normalized parts of a key, it does not occur in user text
+KEY_SEPARATOR = "\x1f"
+
+
+def normalize_text(value: str) -> str:
+    return " ".join(str(value).split()).casefold()
+
+
+def normalize_prompt(value: str) -> str:
+    """
+    Like normalize_text, but punctuation ending the sentence is ignored as well.
+    Other punctuation is kept, operators and signs change the meaning of a
+    prompt ("P/E > 20" and "P/E < 20", "-5%" and "5%").
+    """
+    return normalize_text(re.sub(r"[\s.!?]+$", "", str(value)))
+
+
+class LLMCache(Generic[T]):
+    def __init__(
+        self,
+        name: str,
+        max_size: int = 1024,
+        ttl: float = 3600.0,
+        db_path: str | None = None,
+        dumps: Callable[[T], str] | None = None,
+        loads: Callable[[str], T] | None = None,
+        normalize: Callable[[str], str] = normalize_text,
+    ):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.normalize = normalize
+        self._entries: OrderedDict[str, tuple[float, T]] = OrderedDict()
+        self._dumps = dumps
+        self._loads = loads
+        self._db: sqlite3.Connection | None = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if db_path:
+            if dumps is None or loads is None:
+                raise ValueError(
+                    "A persistent LLMCache needs dumps and loads functions"
+                )
+            self._db = sqlite3.connect(db_path)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache "
+                "(name TEXT, key TEXT, value TEXT, expires_at REAL, "
+                "PRIMARY KEY (name, key))"
+            )
+            self._db.execute(
+                "DELETE FROM llm_cache WHERE name = ? AND expires_at < ?",
+                (name, time.time()),
+            )
+            self._db.commit()
+            logging.info("LLM cache %s persisted to %s", name, db_path)
+
+    def make_key(self, parts: Iterable[str]) -> str:
+        return KEY_SEPARATOR.join(self.normalize(part) for part in parts)
+
+    def get(self, parts: Iterable[str]) -> T | None:
+        key = self.make_key(parts)
+        entry = self._entries.get(key)
+        if entry is None and self._db is not None:
+            entry = self._load(key)
+        if entry is not None and entry[0] < time.time():
+            self._entries.pop(key, None)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        self._evict()
+        self.hits += 1
+        return entry[1]
+
+    def set(self, parts: Iterable[str], value: T):
+        key = self.make_key(parts)
+        expires_at = time.time() + self.ttl
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        self._evict()
+        if self._db is not None:
+            self._db.execute(
+                "INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?)",
+                (self.name, key, self._dumps(value), expires_at),
+            )
+            self._db.commit()
+
+    def _load(self, key: str) -> tuple[float, T] | None:
+        row = self._db.execute(
+            "SELECT expires_at, value FROM llm_cache WHERE name = ? AND key = ?",
+            (self.name, key),
+        ).fetchone()
+        if row is None:
+            return None
+        return row[0], self._loads(row[1])
+
+    def _evict(self):
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+        if self._db is not None:
+            self._db.execute("DELETE FROM llm_cache WHERE name = ?", (self.name,))
+            self._db.commit()
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "persistent": self._db is not None,
+        }
@@ -0,0 +1,244 @@
+"""
+Latency histograms and LLM usage counters per pipeline stage.
+
+Every stage of a canvas runs inside a `span(stage)`:
+
+    canvas                  the whole canvas of a job or stream
+    llm.<BAML function>     GenerateCanvas, GenerateToolCalls, GenerateCanvasWithTools
+    tool.<ToolType>         every tool in generate_canvas.TOOLS
+    save_canvas             queueing the canvas for the archive
+    session.<operation>     session store operations of the API
+
+The duration of a span lands in a histogram per stage and status (ok, error,
+cancelled). LLM spans (`llm_span`) pass a BAML Collector to the call and add
+its token counts and request/response bytes to counters. `render()` returns
+everything in the Prometheus text format (see GET /metrics).
+
+The spans of an API request are also collected for its Server-Timing header:
+main.py sets `server_timings` to a list for every /canvas request. POST /canvas
+only starts a job and /canvas/stream sends its headers before the first stage,
+so the pipeline stages are reported per job instead: a job collects its own
+spans and keeps their totals (`stage_totals`) as the `timings` of the job in
+GET /canvas/{session_id}, a stream sends them as a final `timing` event.
+
+Example Usage:
+
+from metrics import llm_span, span
+
+with span("tool.OHLCV"):
+    data = await call_ohlcv(symbol, first, last)
+
+with llm_span("GenerateCanvas") as options:
+    canvas = await b_async.GenerateCanvas(user_input, context, baml_options=options)
+"""
+
+import contextvars
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+from baml_py import Collector
+
+# Upper bounds in seconds, from cache hits to slow LLM calls
+STAGE_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+# (stage, milliseconds) of the spans of the current request or job, None outside
+server_timings: contextvars.ContextVar[list[tuple[str, float]] | None] = (
+    contextvars.ContextVar("server_timings", default=None)
+)
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}"
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        label_names: tuple[str, ...],
+        buckets: tuple[float, ...],
+    ):
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self.buckets = buckets
+        # labels -> [count per bucket..., sum, count]
+        self._series: dict[tuple[str, ...], list[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: tuple[str, ...], value: float):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def counts(self) -> dict[tuple[str, ...], int]:
+        with self._lock:
+            return {labels: series[-1] for labels, series in self._series.items()}
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted(
+                (labels, list(series)) for labels, series in self._series.items()
+            )
+        for labels, series in items:
+            for bound, count in zip(
+                (*self.buckets, "+Inf"), (*series[:-2], series[-1])
+            ):
+                bucket_labels = _labels(self.label_names, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {count}")
+            lines.append(
+                f"{self.name}_sum{_labels(self.label_names, labels)} {series[-2]}"
+            )
+            lines.append(
+                f"{self.name}_count{_labels(self.label_names, labels)} {series[-1]}"
+            )
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help: str, label_names: tuple[str, ...]):
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self._values: dict[tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: tuple[str, ...], value: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + value
+
+    def values(self) -> dict[tuple[str, ...], float]:
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+stage_seconds = Histogram(
+    "canvas_stage_duration_seconds",
+    "Duration of the canvas pipeline stages.",
+    ("stage", "status"),
+    STAGE_BUCKETS,
+)
+llm_tokens = Counter(
+    "canvas_llm_tokens_total",
+    "LLM tokens per stage, as reported by the BAML collector.",
+    ("stage", "direction"),
+)
+llm_bytes = Counter(
+    "canvas_llm_bytes_total",
+    "Bytes of the LLM HTTP requests and responses per stage.",
+    ("stage", "direction"),
+)
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time the block and record it as `stage`."""
+    started_at = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except BaseException as e:
+        status = "error" if isinstance(e, Exception) else "cancelled"
+        raise
+    finally:
+        seconds = time.perf_counter() - started_at
+        stage_seconds.observe((stage, status), seconds)
+        timings = server_timings.get()
+        if timings is not None:
+            timings.append((stage, seconds * 1000))
+        logging.debug("Span %s (%s) took %.1f ms", stage, status, seconds * 1000)
+
+
+def _body_size(body: Any) -> int:
+    if body is None:
+        return 0
+    if isinstance(body, (dict, list)):
+        return len(json.dumps(body).encode())
+    return len(str(body).encode())
+
+
+def record_llm_usage(stage: str, collector: Collector):
+    """Add the tokens and bytes of the last call seen by `collector` to the counters."""
+    log = collector.last
+    if log is None:
+        return
+    if log.usage.input_tokens:
+        llm_tokens.inc((stage, "input"), log.usage.input_tokens)
+    if log.usage.output_tokens:
+        llm_tokens.inc((stage, "output"), log.usage.output_tokens)
+    for call in log.calls:
+        request = getattr(call, "http_request", None)
+        if request is not None:
+            llm_bytes.inc((stage, "request"), len(request.body.raw()))
+        response = getattr(call, "http_response", None)
+        if response is not None:
+            llm_bytes.inc((stage, "response"), _body_size(response.body))
+
+
+@contextmanager
+def llm_span(function_name: str) -> Iterator[dict[str, Any]]:
+    """Span of a BAML call, yields the baml_options to pass to the call."""
+    stage = f"llm.{function_name}"
+    collector = Collector(name=stage)
+    with span(stage):
+        try:
+            yield {"collector": collector}
+        finally:
+            record_llm_usage(stage, collector)
+
+
+def stage_totals(timings: list[tuple[str, float]]) -> dict[str, float]:
+    """Summed milliseconds per stage, in the order the stages first finished."""
+    per_stage: dict[str, float] = {}
+    for stage, ms in timings:
+        per_stage[stage] = per_stage.get(stage, 0.0) + ms
+    return {stage: round(ms, 1) for stage, ms in per_stage.items()}
+
+
+def server_timing_header(timings: list[tuple[str, float]], total_ms: float) -> str:
+    """Server-Timing value with the summed duration per stage and the total."""
+    entries = [f"{stage};dur={ms:.1f}" for stage, ms in stage_totals(timings).items()]
+    entries.append(f"total;dur={total_ms:.1f}")
+    return ", ".join(entries)
+
+
+def render() -> str:
+    lines = stage_seconds.render() + llm_tokens.render() + llm_bytes.render()
+    return "\n".join(lines) + "\n"
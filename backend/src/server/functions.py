@@ -1,76 +1,284 @@
 import logging
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, AsyncIterator
 import time
-import threading
 import os
 import sys
 import asyncio
+import json
+import uuid
 
 backend_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 sys.path.append(backend_path)
-from generate_canvas import generate_canvas, DataTile
+from generate_canvas import (
+    stream_canvas,
+    save_canvas,
+    DataTile,
+    tool_call_cache,
+    canvas_plan_cache,
+    tool_calls_in_flight,
+)
+from api.six_client import open_six_client, close_six_client, pool_stats
+from api.ohlcv_cache import ohlcv_cache
+from api.allocations import allocation_store, run_allocation_watcher, RELOAD_INTERVAL
+from canvas_archive import canvas_archive
+from cassette import cassette_stats, close_cassette
+from api.limiter import upstream_limiters
+from api.resilience import resilience_stats
+from src.server.sessions import session_store, run_sweeper, SWEEP_INTERVAL
+import metrics
+from metrics import server_timings, span, stage_totals
 
-MAX_SESSIONS = 50
+# Keeps references to the running workflows so they are not garbage collected
+_background_tasks: set[asyncio.Task] = set()
+_sweeper: Optional[asyncio.Task] = None
+_allocation_watcher: Optional[asyncio.Task] = None
 
 
-# Modified in-memory storage to include timestamps
-sessions: Dict[str, Dict[str, DataTile]] = {}  # session_id -> {timestamp, tiles}
+async def session_exists(session_id: str) -> bool:
+    with span("session.exists"):
+        return await session_store.run(session_store.exists, session_id)
 
 
-def cleanup_old_sessions():
-    """Remove sessions older than 3 minutes"""
-    current_time = time.time()
-    expired_sessions = []
+async def create_session(session_id: str):
+    with span("session.create"):
+        await session_store.run(session_store.create, session_id)
 
-    for session_id, session_data in sessions.items():
-        if current_time - session_data["timestamp"] > 180:  # 3 minutes = 180 seconds
-            expired_sessions.append(session_id)
 
-    for session_id in expired_sessions:
-        del sessions[session_id]
+async def get_session(session_id: str) -> List[Dict[str, Any]]:
+    with span("session.tiles"):
+        return await session_store.run(session_store.tiles, session_id)
 
-    # Schedule the next cleanup
-    cleanup_timer = threading.Timer(60, cleanup_old_sessions)  # Check every minute
-    cleanup_timer.daemon = True
-    cleanup_timer.start()
 
+async def update_session_timestamp(session_id: str):
+    """Update the last access timestamp of a session"""
+    with span("session.touch"):
+        await session_store.run(session_store.touch, session_id)
 
-def session_exists(session_id: str) -> bool:
-    return session_id in sessions
 
+async def add_tile(session_id: str, tile: DataTile, job_id: Optional[str] = None):
+    with span("session.add_tile"):
+        await session_store.run(session_store.add_tile, session_id, tile, job_id)
 
-def create_session(session_id: str):
-    if len(sessions) >= MAX_SESSIONS:
-        logging.warning("Maximum number of sessions exceeded")
 
-    sessions[session_id] = {"timestamp": time.time(), "tiles": []}
+async def set_job_status(
+    session_id: str,
+    job_id: str,
+    status: str,
+    error: Optional[str] = None,
+    timings: Optional[Dict[str, float]] = None,
+):
+    with span("session.set_job_status"):
+        await session_store.run(
+            session_store.set_job_status, session_id, job_id, status, error, timings
+        )
 
 
-def get_session(session_id: str) -> List[DataTile]:
-    if not session_exists(session_id):
-        return []
-    return sessions[session_id]["tiles"]
+async def start_job(
+    session_id: str, prompt: str, mode: Optional[str] = None
+) -> Dict[str, Any]:
+    """Run the workflow for `prompt` in the background and return the new job."""
+    job = {
+        "job_id": uuid.uuid4().hex,
+        "status": "planning",
+        "prompt": prompt,
+        "tiles": 0,
+        "error": None,
+        "created_at": time.time(),
+        "timings": None,
+    }
+    with span("session.add_job"):
+        await session_store.run(session_store.add_job, session_id, job)
 
+    task = asyncio.create_task(
+        trigger_workflow(session_id, job["job_id"], prompt, mode)
+    )
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return dict(job)
 
-def update_session_timestamp(session_id: str):
-    """Update the last access timestamp of a session"""
-    if session_exists(session_id):
-        sessions[session_id]["timestamp"] = time.time()
+
+async def get_session_version(session_id: str) -> Optional[int]:
+    with span("session.version"):
+        return await session_store.run(session_store.version, session_id)
+
+
+async def get_session_state(
+    session_id: str, since: Optional[int] = None
+) -> Optional[str]:
+    """
+    Return the tiles and the status of all jobs of a session as JSON, only the
+    tiles added after version `since` if given.
+    """
+    with span("session.state"):
+        return await session_store.run(session_store.state_json, session_id, since)
+
+
+async def wait_for_session_update(
+    session_id: str, version: Optional[int], timeout: float
+):
+    """Long-poll: wait up to `timeout` seconds until the session changes."""
+    with span("session.wait"):
+        await session_store.wait_for_change(session_id, version, timeout)
+
+
+async def startup():
+    """Open shared resources. Called from the FastAPI lifespan hook."""
+    global _sweeper, _allocation_watcher
+    await open_six_client()
+    _sweeper = asyncio.create_task(run_sweeper(session_store, SWEEP_INTERVAL))
+    _allocation_watcher = asyncio.create_task(
+        run_allocation_watcher(allocation_store, RELOAD_INTERVAL)
+    )
+
+
+async def shutdown():
+    """Release shared resources. Called from the FastAPI lifespan hook."""
+    for task in (_sweeper, _allocation_watcher):
+        if task is not None:
+            task.cancel()
+    for task in list(_background_tasks):
+        task.cancel()
+    await asyncio.gather(*_background_tasks, return_exceptions=True)
+    await close_six_client()
+    session_store.close()
+    # Writes the canvases still queued
+    await asyncio.to_thread(canvas_archive.close)
+    close_cassette()
+
+
+def get_metrics() -> str:
+    """Stage latencies and LLM usage in the Prometheus text format."""
+    return metrics.render()
 
 
-async def trigger_workflow(session_id: str, prompt: str):
+async def get_stats() -> Dict[str, Any]:
+    return {
+        "six_pool": pool_stats(),
+        "ohlcv_cache": ohlcv_cache.stats(),
+        "tool_call_cache": tool_call_cache.stats(),
+        "canvas_plan_cache": canvas_plan_cache.stats(),
+        "tool_calls_in_flight": tool_calls_in_flight.stats(),
+        "upstream_limiters": upstream_limiters.stats(),
+        "six_resilience": resilience_stats(),
+        "sessions": await session_store.run(session_store.stats),
+        "asset_allocations": allocation_store.stats(),
+        "canvas_archive": canvas_archive.stats(),
+        "cassette": cassette_stats(),
+    }
+
+
+async def trigger_workflow(
+    session_id: str, job_id: str, prompt: str, mode: Optional[str] = None
+):
+    """
+    Run the workflow of a job, adding tiles to the session as they are ready.
+    The stage timings of the job are stored with its final status.
+    """
+    # The job outlives the POST /canvas request, it collects its own spans
+    timings = []
+    server_timings.set(timings)
     # Update the timestamp when the session is accessed
-    update_session_timestamp(session_id)
-    # This is where you would trigger the workflow to execute the dashboard
-    canvas = await generate_canvas(user_input=prompt, canvas_context="")
-    if len(canvas) == 0:
+    await update_session_timestamp(session_id)
+    canvas_data = []
+    try:
+        with span("canvas"):
+            async for item in stream_canvas(
+                user_input=prompt, canvas_context="", mode=mode
+            ):
+                if isinstance(item, DataTile):
+                    canvas_data.append(item)
+                    await add_tile(session_id, item, job_id)
+                else:
+                    await set_job_status(session_id, job_id, "fetching")
+    except asyncio.CancelledError:
+        # Other workers may still be polling this job
+        await set_job_status(
+            session_id, job_id, "failed", "cancelled", stage_totals(timings)
+        )
+        raise
+    except Exception as e:
+        logging.error("Workflow failed for session %s: %s", session_id, e)
+        await set_job_status(
+            session_id, job_id, "failed", str(e), stage_totals(timings)
+        )
+        return
+
+    if len(canvas_data) == 0:
         logging.warning("Canvas is empty. No tiles generated.")
-    else:
-        sessions[session_id]["tiles"].extend(canvas)
-        # sessions[session_id] = {"timestamp": time.time(), "tiles": []}
+    save_canvas(
+        sorted(canvas_data, key=lambda data_tile: data_tile.position),
+        session_id=session_id,
+        prompt=prompt,
+    )
+    await set_job_status(session_id, job_id, "done", timings=stage_totals(timings))
+
+
+async def list_history(**filters) -> List[Dict[str, Any]]:
+    """List archived canvases without their tiles, see CanvasArchive.list_canvases."""
+    return await asyncio.to_thread(canvas_archive.list_canvases, **filters)
+
+
+async def get_history_canvas(canvas_id: int) -> Optional[Dict[str, Any]]:
+    return await asyncio.to_thread(canvas_archive.get_canvas, canvas_id)
 
 
-# Start the cleanup timer when your application starts
-cleanup_timer = threading.Timer(60, cleanup_old_sessions)
-cleanup_timer.daemon = True
-cleanup_timer.start()
+async def open_history_canvas(canvas_id: int, session_id: str) -> Optional[str]:
+    """
+    Add the tiles of an archived canvas to a session, without calling the LLM or
+    SIX again. Returns the session state, or None if the canvas does not exist.
+    """
+    canvas = await get_history_canvas(canvas_id)
+    if canvas is None:
+        return None
+    if not await session_exists(session_id):
+        await create_session(session_id)
+    for tile in canvas["tiles"]:
+        await add_tile(session_id, tile)
+    return await get_session_state(session_id)
+
+
+def format_sse(event: str, data: str) -> str:
+    """Format one Server-Sent Event, `data` must be a single line of JSON."""
+    return f"event: {event}\ndata: {data}\n\n"
+
+
+async def stream_workflow(
+    session_id: str, prompt: str, mode: Optional[str] = None
+) -> AsyncIterator[str]:
+    """
+    Run the workflow and yield Server-Sent Events: `plan` with the planned
+    tiles, one `tile` event per DataTile as soon as its data is ready, then
+    `timing` with the milliseconds per pipeline stage and `done` (or `error`)
+    at the end. Tiles are also added to the session.
+    """
+    # The headers are sent before the first stage, the spans go to `timing`
+    timings = []
+    server_timings.set(timings)
+    await update_session_timestamp(session_id)
+    canvas_data = []
+    try:
+        with span("canvas"):
+            async for item in stream_canvas(
+                user_input=prompt, canvas_context="", mode=mode
+            ):
+                if isinstance(item, DataTile):
+                    await add_tile(session_id, item)
+                    canvas_data.append(item)
+                    yield format_sse("tile", item.model_dump_json())
+                else:
+                    yield format_sse("plan", item.model_dump_json())
+    except Exception as e:
+        logging.error("Streaming workflow failed for session %s: %s", session_id, e)
+        yield format_sse("timing", json.dumps(stage_totals(timings)))
+        yield format_sse("error", json.dumps({"detail": str(e)}))
+        return
+
+    if len(canvas_data) == 0:
+        logging.warning("Canvas is empty. No tiles generated.")
+    save_canvas(
+        sorted(canvas_data, key=lambda data_tile: data_tile.position),
+        session_id=session_id,
+        prompt=prompt,
+    )
+    yield format_sse("timing", json.dumps(stage_totals(timings)))
+    yield format_sse("done", json.dumps({"tiles": len(canvas_data)}))
@@ -1,9 +1,11 @@
 from pydantic import BaseModel
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Literal
 
 class InitialQuery(BaseModel):
     prompt: str
     session_id: str
+    # Pipeline mode of generate_canvas, defaults to CANVAS_PIPELINE_MODE
+    mode: Optional[Literal["staged", "speculative", "single_shot"]] = None
 
 class CanvasData(BaseModel):
     diff_id: str
@@ -17,10 +19,13 @@ class CanvasDiff(BaseModel):
     changes: Dict[str, Any]
 
 class CanvasDiffResponse(BaseModel):
-    diff_id: str
-    canvas_id: str
-    timestamp: int
-    changes: Dict[str, Any]
+    """Body of GET /canvas/{session_id}, with `since` only the tiles added after that version."""
+    session_id: str
+    version: int
+    since: Optional[int] = None
+    status: Optional[str] = None
+    jobs: List[Dict[str, Any]]
+    tiles: List[Dict[str, Any]]
 
 class QueryResponse(BaseModel):
     query_id: str
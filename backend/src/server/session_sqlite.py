@@ -0,0 +1,380 @@
+"""
+SQLite session backend, shared by all worker processes on a host.
+
+Every worker opens the same database file in WAL mode, so readers never block
+the writer and a GET /canvas/{session_id} can be served by any worker, no
+matter which one runs the job. Tiles are stored as the JSON written by
+`dump_tile` and concatenated into the response without decoding them.
+
+Every query runs on one database thread per process (`run`), the event loop
+only awaits it: a write waiting up to 5 s for the lock of another worker must
+not stall the requests of this one. Long-polling cannot use an asyncio.Event
+across processes, `wait_for_change` re-reads the session version every
+SESSION_POLL_INTERVAL seconds instead, on the database thread as well.
+
+Configuration (environment variables, see also sessions.py):
+    SESSION_POLL_INTERVAL     Seconds between two version checks of a long-poll
+                              (default 0.1).
+
+Example Usage:
+
+SESSION_BACKEND=sqlite SESSION_DB=/tmp/sessions.sqlite3 uvicorn main:app --workers 4
+"""
+
+import asyncio
+import functools
+import json
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from src.server.sessions import (
+    JOB_RUNNING,
+    SessionStore,
+    dump_tile,
+    first_version,
+    state_body,
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    accessed_at REAL NOT NULL,
+    first_version INTEGER NOT NULL DEFAULT 0,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS sessions_accessed_at ON sessions (accessed_at);
+CREATE TABLE IF NOT EXISTS jobs (
+    session_id TEXT NOT NULL REFERENCES sessions (session_id) ON DELETE CASCADE,
+    job_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    prompt TEXT NOT NULL,
+    tiles INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at REAL NOT NULL,
+    timings TEXT,
+    PRIMARY KEY (session_id, job_id)
+);
+CREATE TABLE IF NOT EXISTS tiles (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL REFERENCES sessions (session_id) ON DELETE CASCADE,
+    version INTEGER NOT NULL DEFAULT 0,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tiles_session ON tiles (session_id, id);
+"""
+
+JOB_COLUMNS = ("job_id", "status", "prompt", "tiles", "error", "created_at")
+
+# Columns added after the first release, created on open when missing
+MIGRATIONS = (
+    ("sessions", "first_version", "INTEGER NOT NULL DEFAULT 0"),
+    ("tiles", "version", "INTEGER NOT NULL DEFAULT 0"),
+    ("jobs", "timings", "TEXT"),
+)
+
+
+class SQLiteSessionStore(SessionStore):
+    def __init__(
+        self,
+        db_path: str,
+        ttl: float = 180.0,
+        max_sessions: int = 50,
+        max_jobs: int = 20,
+        poll_interval: float | None = None,
+    ):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_jobs = max_jobs
+        self.poll_interval = (
+            poll_interval
+            if poll_interval is not None
+            else float(os.getenv("SESSION_POLL_INTERVAL", 0.1))
+        )
+        self._db: sqlite3.Connection | None = None
+        self._pid: int | None = None
+        self._executor: ThreadPoolExecutor | None = None
+        self._executor_pid: int | None = None
+        self.expired = 0
+        self.evicted = 0
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        # Opened lazily and per process, a connection must not cross a fork.
+        if self._db is None or self._pid != os.getpid():
+            # Used by the database thread, and by close() once that has stopped
+            self._db = sqlite3.connect(
+                self.db_path, timeout=5.0, isolation_level=None, check_same_thread=False
+            )
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute("PRAGMA foreign_keys=ON")
+            self._db.executescript(SCHEMA)
+            for table, column, definition in MIGRATIONS:
+                columns = [
+                    row[1] for row in self._db.execute(f"PRAGMA table_info({table})")
+                ]
+                if column not in columns:
+                    self._db.execute(
+                        f"ALTER TABLE {table} ADD COLUMN {column} {definition}"
+                    )
+            self._pid = os.getpid()
+            logging.info("Session store opened at %s", self.db_path)
+        return self._db
+
+    async def run(self, method: Callable, *args) -> Any:
+        # One thread per process, like the connection it uses
+        if self._executor is None or self._executor_pid != os.getpid():
+            self._executor = ThreadPoolExecutor(1, thread_name_prefix="session-db")
+            self._executor_pid = os.getpid()
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, functools.partial(method, *args)
+        )
+
+    def _write(self, statements: List[tuple]) -> bool:
+        """Run `statements` in one transaction, False if the first changed nothing."""
+        db = self.db
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            for i, (sql, params) in enumerate(statements):
+                if db.execute(sql, params).rowcount == 0 and i == 0:
+                    db.execute("ROLLBACK")
+                    return False
+            db.execute("COMMIT")
+            return True
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def _touch(self, session_id: str) -> bool:
+        now = time.time()
+        return self._write(
+            [
+                (
+                    "UPDATE sessions SET accessed_at = ? "
+                    "WHERE session_id = ? AND accessed_at >= ?",
+                    (now, session_id, now - self.ttl),
+                )
+            ]
+        )
+
+    def exists(self, session_id: str) -> bool:
+        return self._touch(session_id)
+
+    def create(self, session_id: str):
+        db = self.db
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute(
+                "SELECT version FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            (count,) = db.execute("SELECT COUNT(*) FROM sessions").fetchone()
+            overflow = count - self.max_sessions + 1
+            if overflow > 0:
+                evicted = db.execute(
+                    "DELETE FROM sessions WHERE session_id IN "
+                    "(SELECT session_id FROM sessions ORDER BY accessed_at LIMIT ?)",
+                    (overflow,),
+                ).rowcount
+                self.evicted += evicted
+                logging.warning(
+                    "Maximum number of sessions reached, evicted %d sessions", evicted
+                )
+            version = first_version(row[0] if row is not None else None)
+            db.execute(
+                "INSERT INTO sessions "
+                "(session_id, accessed_at, first_version, version) "
+                "VALUES (?, ?, ?, ?)",
+                (session_id, time.time(), version, version),
+            )
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def touch(self, session_id: str):
+        self._touch(session_id)
+
+    def tiles(self, session_id: str) -> List[Dict[str, Any]]:
+        if not self._touch(session_id):
+            return []
+        rows = self.db.execute(
+            "SELECT data FROM tiles WHERE session_id = ? ORDER BY id", (session_id,)
+        ).fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    def add_tile(self, session_id: str, tile: Any, job_id: Optional[str] = None):
+        self._write(
+            [
+                (
+                    "UPDATE sessions SET version = version + 1, accessed_at = ? "
+                    "WHERE session_id = ?",
+                    (time.time(), session_id),
+                ),
+                (
+                    "INSERT INTO tiles (session_id, version, data) "
+                    "SELECT session_id, version, ? FROM sessions WHERE session_id = ?",
+                    (dump_tile(tile, job_id), session_id),
+                ),
+                (
+                    "UPDATE jobs SET tiles = tiles + 1, "
+                    "status = CASE status "
+                    "WHEN 'planning' THEN 'fetching' ELSE status END "
+                    "WHERE session_id = ? AND job_id = ?",
+                    (session_id, job_id),
+                ),
+            ]
+        )
+
+    def add_job(self, session_id: str, job: Dict[str, Any]):
+        self._write(
+            [
+                (
+                    "UPDATE sessions SET version = version + 1, accessed_at = ? "
+                    "WHERE session_id = ?",
+                    (time.time(), session_id),
+                ),
+                (
+                    f"INSERT INTO jobs (session_id, {', '.join(JOB_COLUMNS)}) "
+                    f"VALUES (?{', ?' * len(JOB_COLUMNS)})",
+                    (session_id, *(job[column] for column in JOB_COLUMNS)),
+                ),
+                (
+                    "DELETE FROM jobs WHERE session_id = ? AND job_id NOT IN "
+                    "(SELECT job_id FROM jobs WHERE session_id = ? "
+                    "ORDER BY created_at DESC LIMIT ?)",
+                    (session_id, session_id, self.max_jobs),
+                ),
+            ]
+        )
+
+    def set_job_status(
+        self,
+        session_id: str,
+        job_id: str,
+        status: str,
+        error: Optional[str] = None,
+        timings: Optional[Dict[str, float]] = None,
+    ):
+        self._write(
+            [
+                (
+                    "UPDATE jobs SET status = ?, error = ?, "
+                    "timings = COALESCE(?, timings) "
+                    "WHERE session_id = ? AND job_id = ?",
+                    (
+                        status,
+                        error,
+                        json.dumps(timings) if timings is not None else None,
+                        session_id,
+                        job_id,
+                    ),
+                ),
+                (
+                    "UPDATE sessions SET version = version + 1 WHERE session_id = ?",
+                    (session_id,),
+                ),
+            ]
+        )
+
+    def _version(self, session_id: str) -> Optional[int]:
+        row = self.db.execute(
+            "SELECT version FROM sessions WHERE session_id = ? AND accessed_at >= ?",
+            (session_id, time.time() - self.ttl),
+        ).fetchone()
+        return row[0] if row is not None else None
+
+    def version(self, session_id: str) -> Optional[int]:
+        return self._version(session_id)
+
+    def _jobs(self, session_id: str) -> List[Dict[str, Any]]:
+        rows = self.db.execute(
+            f"SELECT {', '.join(JOB_COLUMNS)}, timings FROM jobs "
+            "WHERE session_id = ? ORDER BY created_at",
+            (session_id,),
+        ).fetchall()
+        return [
+            {
+                **dict(zip(JOB_COLUMNS, row)),
+                "timings": json.loads(row[-1]) if row[-1] is not None else None,
+            }
+            for row in rows
+        ]
+
+    def state_json(self, session_id: str, since: Optional[int] = None) -> Optional[str]:
+        if not self._touch(session_id):
+            return None
+        db = self.db
+        # One read transaction, so version, jobs and tiles are consistent
+        db.execute("BEGIN")
+        try:
+            row = db.execute(
+                "SELECT first_version, version FROM sessions WHERE session_id = ?",
+                (session_id,),
+            ).fetchone()
+            version = row[1] if row is not None else None
+            if row is not None and since is not None and not row[0] <= since <= version:
+                since = None
+            jobs = self._jobs(session_id)
+            tiles = [
+                data
+                for (data,) in db.execute(
+                    "SELECT data FROM tiles "
+                    "WHERE session_id = ? AND version > ? ORDER BY id",
+                    (session_id, since if since is not None else -1),
+                )
+            ]
+        finally:
+            db.execute("COMMIT")
+        if version is None:
+            return None
+        return state_body(session_id, version, jobs, tiles, since)
+
+    async def wait_for_change(
+        self, session_id: str, version: Optional[int], timeout: float
+    ):
+        current = await self.run(self._version, session_id)
+        if current is None or timeout <= 0:
+            return
+        if version is not None and version != current:
+            return
+        jobs = await self.run(self._jobs, session_id)
+        if not any(job["status"] in JOB_RUNNING for job in jobs):
+            return
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(min(self.poll_interval, deadline - time.monotonic()))
+            if await self.run(self._version, session_id) != current:
+                return
+
+    def sweep(self) -> int:
+        # Uses the accessed_at index, jobs and tiles are removed by the cascade.
+        removed = self.db.execute(
+            "DELETE FROM sessions WHERE accessed_at < ?", (time.time() - self.ttl,)
+        ).rowcount
+        self.expired += removed
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        (count,) = self.db.execute("SELECT COUNT(*) FROM sessions").fetchone()
+        return {
+            "backend": "sqlite",
+            "sessions": count,
+            "max_sessions": self.max_sessions,
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
+
+    def close(self):
+        if self._executor is not None and self._executor_pid == os.getpid():
+            # Lets the queries already handed to the thread finish first
+            self._executor.shutdown()
+        self._executor = None
+        if self._db is not None and self._pid == os.getpid():
+            self._db.close()
+        self._db = None
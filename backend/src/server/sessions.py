@@ -0,0 +1,384 @@
+"""
+Session storage for the canvas API.
+
+A session holds the tiles generated for a client and the jobs that produced
+them. `SessionStore` is the interface used by functions.py. Tiles are serialized
+once when they are added, reads return the stored JSON without re-validating
+the tiles.
+
+Every change bumps the version of the session. Each tile keeps the version it
+was added at, so `state_json(session_id, since=version)` returns only the tiles
+added after a version the client already has (tiles are only ever appended).
+A new session starts at the current time in milliseconds (`first_version`), so
+a session id that expired and was recreated does not repeat the versions of its
+earlier incarnation. A `since` from before the start of the session is
+answered with all tiles.
+
+`InMemorySessionStore` (SESSION_BACKEND=memory) keeps the sessions in an
+OrderedDict sorted by last access:
+
+- every access moves the session to the end, so expired sessions are always at
+  the front and `sweep()` only touches the sessions it removes;
+- at MAX_SESSIONS the least recently used session is evicted before a new one
+  is created, so memory stays bounded under load.
+
+`SQLiteSessionStore` (SESSION_BACKEND=sqlite, see session_sqlite.py) shares
+the sessions between all worker processes on a host, so the app can run with
+`uvicorn main:app --workers N`.
+
+Callers on the event loop go through `await store.run(store.method, ...)`:
+the memory backend runs the method right away, the sqlite backend hands it to
+a database thread of its own, so a busy database never stalls the loop.
+`sweep()` is driven by an asyncio task started in the application lifespan
+(see `run_sweeper`).
+
+Configuration (environment variables):
+    SESSION_BACKEND           "memory" (default) or "sqlite".
+    SESSION_DB                SQLite file of the sqlite backend
+                              (default sessions.sqlite3 in the backend).
+    SESSION_TTL               Seconds a session is kept after its last access
+                              (default 180).
+    MAX_SESSIONS              Maximum number of sessions (default 50).
+    MAX_JOBS_PER_SESSION      Jobs kept per session, the oldest are dropped
+                              (default 20).
+    SESSION_SWEEP_INTERVAL    Seconds between two sweeps (default 60).
+
+Example Usage:
+
+from src.server.sessions import session_store
+
+await session_store.run(session_store.create, session_id)
+await session_store.run(session_store.add_tile, session_id, tile, job_id)
+body = await session_store.run(session_store.state_json, session_id)
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from bisect import bisect_right
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+backend_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+# Status of a canvas job: planning -> fetching -> done | failed
+JOB_RUNNING = ("planning", "fetching")
+
+
+def first_version(previous: Optional[int] = None) -> int:
+    """Version of a new session, after `previous` if it replaces a stored session."""
+    now = int(time.time() * 1000)
+    return now if previous is None else max(now, previous + 1)
+
+
+def dump_tile(tile: Any, job_id: Optional[str] = None) -> str:
+    """
+    Serialize a tile, tagged with the job that produced it. Tiles are stored in
+    the order they finish, clients order the tiles of a job by `position`.
+    """
+    data = (
+        tile.model_dump_json() if hasattr(tile, "model_dump_json") else json.dumps(tile)
+    )
+    if job_id is None or data == "{}":
+        return data
+    return f'{{"job_id": {json.dumps(job_id)}, {data[1:]}'
+
+
+def state_body(
+    session_id: str,
+    version: int,
+    jobs: List[Dict[str, Any]],
+    tiles: List[str],
+    since: Optional[int] = None,
+) -> str:
+    """
+    Build the JSON of a session state around the already serialized tiles. With
+    `since`, `tiles` are only the tiles added after that version.
+    """
+    meta = json.dumps(
+        {
+            "session_id": session_id,
+            "version": version,
+            "since": since,
+            "status": jobs[-1]["status"] if jobs else None,
+            "jobs": jobs,
+        }
+    )
+    return f'{meta[:-1]}, "tiles": [{", ".join(tiles)}]}}'
+
+
+class SessionStore(ABC):
+    """Interface of the session backends."""
+
+    async def run(self, method: Callable, *args) -> Any:
+        """Call a method of the store from the event loop."""
+        return method(*args)
+
+    @abstractmethod
+    def exists(self, session_id: str) -> bool: ...
+
+    @abstractmethod
+    def create(self, session_id: str):
+        """Create an empty session, replacing an existing one with the same id."""
+
+    @abstractmethod
+    def touch(self, session_id: str):
+        """Mark the session as accessed, which extends its lifetime."""
+
+    @abstractmethod
+    def tiles(self, session_id: str) -> List[Dict[str, Any]]:
+        """Return the tiles of a session, decoded from their stored JSON."""
+
+    @abstractmethod
+    def add_tile(self, session_id: str, tile: Any, job_id: Optional[str] = None): ...
+
+    @abstractmethod
+    def add_job(self, session_id: str, job: Dict[str, Any]): ...
+
+    @abstractmethod
+    def set_job_status(
+        self,
+        session_id: str,
+        job_id: str,
+        status: str,
+        error: Optional[str] = None,
+        timings: Optional[Dict[str, float]] = None,
+    ):
+        """Set the status of a job, and its stage timings (ms per stage) if given."""
+
+    @abstractmethod
+    def version(self, session_id: str) -> Optional[int]:
+        """Return the current version of a session, or None if it does not exist."""
+
+    @abstractmethod
+    def state_json(self, session_id: str, since: Optional[int] = None) -> Optional[str]:
+        """
+        Return the version, jobs and tiles of a session as a JSON object, or None
+        if the session does not exist. With `since`, only the tiles added after
+        that version are returned; a `since` outside of the versions of the
+        session (e.g. from an earlier session with the same id) returns all tiles
+        and a null `since`.
+        """
+
+    @abstractmethod
+    async def wait_for_change(
+        self, session_id: str, version: Optional[int], timeout: float
+    ):
+        """
+        Wait up to `timeout` seconds until the session changes. Returns at once if
+        `version` is already outdated or no job of the session is running.
+        """
+
+    @abstractmethod
+    def sweep(self) -> int:
+        """Remove expired sessions and return how many were removed."""
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]: ...
+
+    def close(self):
+        pass
+
+
+class _Session:
+    __slots__ = (
+        "tiles",
+        "tile_versions",
+        "jobs",
+        "first_version",
+        "version",
+        "changed",
+        "accessed_at",
+    )
+
+    def __init__(self, version: int):
+        self.tiles: List[str] = []  # serialized tiles
+        # Version each tile was added at, ascending, for the `since` lookups
+        self.tile_versions: List[int] = []
+        self.jobs: OrderedDict[str, Dict[str, Any]] = OrderedDict()
+        # Bumped on every change, long-polling clients wait on `changed`
+        self.first_version = self.version = version
+        self.changed = asyncio.Event()
+        self.accessed_at = time.monotonic()
+
+    def notify(self):
+        self.version += 1
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+
+class InMemorySessionStore(SessionStore):
+    def __init__(self, ttl: float = 180.0, max_sessions: int = 50, max_jobs: int = 20):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_jobs = max_jobs
+        self._sessions: OrderedDict[str, _Session] = OrderedDict()
+        self.expired = 0
+        self.evicted = 0
+
+    def _get(self, session_id: str) -> Optional[_Session]:
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        if time.monotonic() - session.accessed_at > self.ttl:
+            del self._sessions[session_id]
+            self.expired += 1
+            return None
+        session.accessed_at = time.monotonic()
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def exists(self, session_id: str) -> bool:
+        return session_id in self._sessions and self._get(session_id) is not None
+
+    def create(self, session_id: str):
+        previous = self._sessions.pop(session_id, None)
+        while len(self._sessions) >= self.max_sessions:
+            evicted_id, _ = self._sessions.popitem(last=False)
+            self.evicted += 1
+            logging.warning(
+                "Maximum number of sessions reached, evicted session %s", evicted_id
+            )
+        self._sessions[session_id] = _Session(
+            first_version(previous.version if previous is not None else None)
+        )
+
+    def touch(self, session_id: str):
+        self._get(session_id)
+
+    def tiles(self, session_id: str) -> List[Dict[str, Any]]:
+        session = self._get(session_id)
+        return (
+            [json.loads(tile) for tile in session.tiles] if session is not None else []
+        )
+
+    def add_tile(self, session_id: str, tile: Any, job_id: Optional[str] = None):
+        session = self._get(session_id)
+        if session is None:
+            return
+        session.tiles.append(dump_tile(tile, job_id))
+        job = session.jobs.get(job_id)
+        if job is not None:
+            job["tiles"] += 1
+            if job["status"] == "planning":
+                job["status"] = "fetching"
+        session.notify()
+        session.tile_versions.append(session.version)
+
+    def add_job(self, session_id: str, job: Dict[str, Any]):
+        session = self._get(session_id)
+        if session is None:
+            return
+        session.jobs[job["job_id"]] = dict(job)
+        while len(session.jobs) > self.max_jobs:
+            session.jobs.popitem(last=False)
+        session.notify()
+
+    def set_job_status(
+        self,
+        session_id: str,
+        job_id: str,
+        status: str,
+        error: Optional[str] = None,
+        timings: Optional[Dict[str, float]] = None,
+    ):
+        session = self._get(session_id)
+        job = session.jobs.get(job_id) if session is not None else None
+        if job is None:
+            return
+        job["status"] = status
+        job["error"] = error
+        if timings is not None:
+            job["timings"] = timings
+        session.notify()
+
+    def version(self, session_id: str) -> Optional[int]:
+        session = self._get(session_id)
+        return session.version if session is not None else None
+
+    def state_json(self, session_id: str, since: Optional[int] = None) -> Optional[str]:
+        session = self._get(session_id)
+        if session is None:
+            return None
+        tiles = session.tiles
+        if since is not None and not session.first_version <= since <= session.version:
+            since = None
+        elif since is not None:
+            tiles = tiles[bisect_right(session.tile_versions, since) :]
+        return state_body(
+            session_id, session.version, list(session.jobs.values()), tiles, since
+        )
+
+    async def wait_for_change(
+        self, session_id: str, version: Optional[int], timeout: float
+    ):
+        session = self._get(session_id)
+        if session is None or timeout <= 0:
+            return
+        if version is not None and version != session.version:
+            return
+        if not any(job["status"] in JOB_RUNNING for job in session.jobs.values()):
+            return
+        try:
+            await asyncio.wait_for(session.changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def sweep(self) -> int:
+        # Sessions are ordered by last access, stop at the first one still alive.
+        deadline = time.monotonic() - self.ttl
+        removed = 0
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if session.accessed_at > deadline:
+                break
+            del self._sessions[session_id]
+            removed += 1
+        self.expired += removed
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "memory",
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
+
+
+async def run_sweeper(store: SessionStore, interval: float):
+    """Remove expired sessions every `interval` seconds, until cancelled."""
+    while True:
+        await asyncio.sleep(interval)
+        removed = await store.run(store.sweep)
+        if removed:
+            logging.info("Removed %d expired sessions", removed)
+
+
+def create_session_store() -> SessionStore:
+    """Create the session backend selected by SESSION_BACKEND."""
+    backend = os.getenv("SESSION_BACKEND", "memory")
+    options = dict(
+        ttl=float(os.getenv("SESSION_TTL", 180)),
+        max_sessions=int(os.getenv("MAX_SESSIONS", 50)),
+        max_jobs=int(os.getenv("MAX_JOBS_PER_SESSION", 20)),
+    )
+    if backend == "memory":
+        return InMemorySessionStore(**options)
+    if backend == "sqlite":
+        from src.server.session_sqlite import SQLiteSessionStore
+
+        return SQLiteSessionStore(
+            os.getenv("SESSION_DB", os.path.join(backend_path, "sessions.sqlite3")),
+            **options,
+        )
+    raise ValueError(f"Unknown SESSION_BACKEND '{backend}', use 'memory' or 'sqlite'")
+
+
+SWEEP_INTERVAL = float(os.getenv("SESSION_SWEEP_INTERVAL", 60))
+
+session_store: SessionStore = create_session_store()
@@ -0,0 +1,89 @@
+"""
+Coalescing of identical concurrent calls.
+
+While a call for a key is in flight, further calls with the same key do not
+start their own request but wait for the result of the first one. The first
+call runs as a task of its own, so a caller that is cancelled does not cancel
+it for the others; only when every caller has gone is the task cancelled.
+Exceptions are raised in every caller. Once the call is done, the key is free
+again, results are not cached (see llm_cache.py and api/ohlcv_cache.py).
+
+The task runs in an empty context, not in a copy of the first caller's: it
+must not inherit e.g. that caller's canvas deadline and fail the others with
+it. Instead every caller waits at most `timeout()` seconds (None for no limit)
+for the shared result, and gets a TimeoutError after that.
+
+Example Usage:
+
+from single_flight import SingleFlight
+
+tool_calls_in_flight = SingleFlight("tool_calls", timeout=remaining_budget)
+data = await tool_calls_in_flight.do(
+    ("OHLCV", "nvidia"), lambda: call_ohlcv("NVIDIA", first, last)
+)
+"""
+
+import asyncio
+import contextvars
+from typing import Any, Awaitable, Callable, Generic, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class _Call:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight(Generic[T]):
+    def __init__(self, name: str, timeout: Callable[[], float | None] | None = None):
+        self.name = name
+        self.timeout = timeout
+        self._calls: dict[Hashable, _Call] = {}
+        self.calls = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """Return the result of `fn()`, shared with all concurrent calls for `key`."""
+        call = self._calls.get(key)
+        if call is None:
+            loop = asyncio.get_running_loop()
+            call = _Call(loop.create_task(fn(), context=contextvars.Context()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda task: self._done(key, call))
+            self.calls += 1
+        else:
+            self.coalesced += 1
+
+        call.waiters += 1
+        try:
+            timeout = self.timeout() if self.timeout is not None else None
+            return await asyncio.wait_for(asyncio.shield(call.task), timeout)
+        except (asyncio.CancelledError, TimeoutError):
+            if call.waiters == 1 and not call.task.done():
+                # Nobody else wants the result anymore, later calls start anew
+                call.task.cancel()
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            raise
+        finally:
+            call.waiters -= 1
+
+    def _done(self, key: Hashable, call: _Call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        if not call.task.cancelled() and call.task.exception() is not None:
+            # Also marks the exception as retrieved if every caller was cancelled
+            self.errors += 1
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "in_flight": len(self._calls),
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+        }
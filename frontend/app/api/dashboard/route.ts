@@ -5,6 +5,10 @@ import { v4 as uuidv4 } from 'uuid';
 const BASE_URL = 'https://start-hack-backend-867796808812.europe-west8.run.app';
 const SESSION_ID = uuidv4();
 const API_KEY = process.env.API_KEY;
+// Seconds the backend holds a status request until the canvas changes
+const LONG_POLL_SECONDS = 25;
+// Longest the route waits for a canvas, the tiles received by then are returned
+const MAX_WAIT_MS = 90_000;
 
 export async function POST(request: NextRequest) {
   try {
@@ -27,31 +31,77 @@ export async function POST(request: NextRequest) {
       throw new Error(`Failed to create canvas: ${createResponse.status} ${errorText}`);
     }
 
-    // Wait a moment for processing (adjust timing as needed)
-    await new Promise(resolve => setTimeout(resolve, 2000));
+    // The canvas is generated in the background, long-poll until the job is finished
+    const { job_id: jobId } = await createResponse.json();
+    // Only the tiles added since the last version are sent, collect them here
+    let version: number | undefined;
+    let data: any;
+    let allTiles: any[] = [];
+    const deadline = Date.now() + MAX_WAIT_MS;
+    while (true) {
+      const remainingMs = deadline - Date.now();
+      if (remainingMs <= 0) {
+        console.warn(`Canvas job ${jobId} not done in ${MAX_WAIT_MS} ms, returning its tiles so far`);
+        break;
+      }
+      const getUrl = new URL(`${BASE_URL}/canvas/${SESSION_ID}`);
+      getUrl.searchParams.append(
+        'wait',
+        String(Math.min(LONG_POLL_SECONDS, Math.floor(remainingMs / 1000)))
+      );
+      if (version !== undefined) {
+        getUrl.searchParams.append('since', String(version));
+      }
 
-    // Step 2: Get the canvas result
-    const getResponse = await fetch(`${BASE_URL}/canvas/${SESSION_ID}`, {
-      method: 'GET',
-      headers: {
-        'API-KEY': API_KEY
+      let getResponse: Response;
+      try {
+        getResponse = await fetch(getUrl.toString(), {
+          method: 'GET',
+          headers: {
+            'API-KEY': API_KEY
+          },
+          signal: AbortSignal.timeout(remainingMs)
+        });
+      } catch (error: any) {
+        // The backend stopped answering, return the tiles received so far
+        if (error.name === 'TimeoutError') {
+          console.warn(`Canvas job ${jobId} timed out, returning its tiles so far`);
+          break;
+        }
+        throw error;
+      }
+
+      if (!getResponse.ok) {
+        const errorText = await getResponse.text();
+        throw new Error(`Failed to get canvas data: ${getResponse.status} ${errorText}`);
       }
-    });
 
-    if (!getResponse.ok) {
-      const errorText = await getResponse.text();
-      throw new Error(`Failed to get canvas data: ${getResponse.status} ${errorText}`);
+      data = await getResponse.json();
+      version = data.version;
+      // `since` is null when the backend sent all tiles, e.g. for a recreated session
+      allTiles = data.since === null ? data.tiles : allTiles.concat(data.tiles);
+      const job = data.jobs.find(job => job.job_id === jobId);
+      if (!job || job.status === 'failed') {
+        throw new Error(`Failed to generate canvas: ${job?.error ?? 'job not found'}`);
+      }
+      if (job.status === 'done') {
+        break;
+      }
     }
 
-    const data = await getResponse.json();
-    
+    // Tiles arrive in the order they finish, show every canvas in the order of its plan.
+    // The sort is stable, tiles without a known job (e.g. opened from the history) come
+    // first and keep their order.
+    const jobOrder = new Map((data?.jobs ?? []).map((job, index) => [job.job_id, index]));
+    const rank = tile => jobOrder.get(tile.job_id) ?? -1;
+    const ordered = [...allTiles].sort(
+      (a, b) => rank(a) - rank(b) || (rank(a) < 0 ? 0 : a.position - b.position)
+    );
+
     // Filter out any PIE charts from the backend data
-    // Assuming data has a tiles array that contains the chart tiles
-    if (data.tiles && Array.isArray(data.tiles)) {
-      data.tiles = data.tiles.filter(tile => tile.type !== "PIE");
-    }
-    
-    return NextResponse.json(data);
+    const tiles = ordered.filter(tile => tile.type !== "PIE");
+
+    return NextResponse.json(tiles);
   } catch (error: any) {
     console.error('API Error:', error);
     
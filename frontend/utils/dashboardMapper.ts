@@ -37,10 +37,31 @@ export function mapApiResponseToTiles(apiResponse: any[]): Tile[] {
     });
 }
 
+/**
+ * Checks if the data is a columnar OHLCV series ({ t, o, h, l, c, v })
+ */
+function isColumnarOhlcv(data: any): boolean {
+    return !!data && !Array.isArray(data) && Array.isArray(data.t) && Array.isArray(data.c);
+}
+
 /**
  * Maps candlestick chart data
  */
 function mapCandlestickData(item: any, metadata: any): Tile {
+    if (isColumnarOhlcv(item.data)) {
+        const { t, o, h, l, c, v } = item.data;
+        const candlestickData: CandlestickData[] = t.map((x: string, i: number) => ({
+            x,
+            y: [o[i] || 0, h[i] || 0, l[i] || 0, c[i] || 0],
+            volume: (v && v[i]) || 0,
+        }));
+        return {
+            type: "CANDLE",
+            data: candlestickData,
+            metadata,
+        };
+    }
+
     const candlestickData: CandlestickData[] = (item.data || []).map((d: any) => ({
         x: d.name || new Date(d.date || "").toString(),
         y: [
@@ -65,8 +86,19 @@ function mapCandlestickData(item: any, metadata: any): Tile {
 function mapAreaData(item: any, metadata: any): Tile {
     let areaSeries: AreaData[] = [];
 
+    // Handle columnar OHLCV data, plotted on the close price
+    if (isColumnarOhlcv(item.data)) {
+        const { t, c } = item.data;
+        areaSeries = [{
+            name: "Series",
+            data: t.map((x: string, i: number) => ({
+                x: new Date(x).getTime(),
+                y: c[i] || 0,
+            })),
+        }];
+    }
     // Handle multiple series data
-    if (Array.isArray(item.data) && item.data.length > 0 && Array.isArray(item.data[0].data)) {
+    else if (Array.isArray(item.data) && item.data.length > 0 && Array.isArray(item.data[0].data)) {
         // Multi-series format
         areaSeries = item.data.map((series: any) => ({
             name: series.name || "Series",